@@ -0,0 +1,323 @@
+"""
+Columnar analytics export.
+
+Selected tables are streamed out of Postgres with ``COPY ... TO STDOUT`` (one
+psql per table, in parallel, all on the same exported snapshot), parsed
+incrementally by pyarrow's streaming CSV reader and written as Parquet row
+groups. Memory per table is bounded by one row group; /tmp by one output
+file. Tables with a date column are Hive-partitioned by day so cost and
+token analyses can read just the days they need, e.g. with DuckDB:
+
+    SELECT model_used, sum(calculated_cost_cents)
+    FROM read_parquet('s3://BUCKET/db-backups/analytics/vibrationfit_<ts>/public.token_usage/*/*.parquet',
+                      hive_partitioning = true)
+    WHERE date >= '2025-11-01' GROUP BY 1;
+
+Layout under ``{prefix}/analytics/vibrationfit_<ts>/``:
+    manifest.json
+    <schema>.<table>/date=YYYY-MM-DD/part-00000.parquet    partitioned tables
+    <schema>.<table>/part-00000.parquet                    everything else
+
+Enable with ANALYTICS_TABLES="public.token_usage:created_at,public.ai_model_pricing"
+(``table:date_column``; the date column is optional).
+"""
+
+import json
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from psql import PsqlSession
+
+ROW_GROUP_ROWS = int(os.environ.get("ANALYTICS_ROW_GROUP_ROWS", "100000"))
+FILE_ROWS = int(os.environ.get("ANALYTICS_FILE_ROWS", "2000000"))
+PARQUET_COMPRESSION = os.environ.get("ANALYTICS_PARQUET_COMPRESSION", "zstd")
+CSV_BLOCK_SIZE = 8 * 1024 * 1024
+PARTITION_COLUMN = "__partition"
+
+COLUMNS_SQL = """
+SELECT coalesce(json_agg(json_build_object(
+  'name', a.attname,
+  'type', t.typname,
+  'precision', CASE WHEN t.typname = 'numeric' AND a.atttypmod > 0
+                    THEN ((a.atttypmod - 4) >> 16) & 65535 END,
+  'scale', CASE WHEN t.typname = 'numeric' AND a.atttypmod > 0
+                THEN (a.atttypmod - 4) & 65535 END
+) ORDER BY a.attnum), '[]')
+FROM pg_attribute a
+JOIN pg_type t ON t.oid = a.atttypid
+WHERE a.attrelid = %(table)s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+"""
+
+
+def parse_tables(spec):
+    """'public.token_usage:created_at,x' -> [('public.token_usage', 'created_at'), ('public.x', None)]"""
+    if isinstance(spec, list):
+        spec = ",".join(spec)
+    tables = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        table, _, date_column = part.partition(":")
+        table = table.strip()
+        # Unqualified names resolve through the search_path, i.e. to public
+        if "." not in table:
+            table = f"public.{table}"
+        tables.append((table, date_column.strip() or None))
+    return tables
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("pyarrow is required for the analytics export (pip install pyarrow)")
+    return pyarrow
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_plan(pa, column):
+    """(SELECT expression, arrow type) for one Postgres column.
+
+    Timestamps are formatted as ISO 8601 in SQL so arrow's CSV parser reads
+    them without guessing; types arrow can't represent become strings.
+    """
+    ident = quote_ident(column["name"])
+    kind = column["type"]
+    if kind == "timestamptz":
+        return (f"""to_char({ident} AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"')""",
+                pa.timestamp("us", tz="UTC"))
+    if kind == "timestamp":
+        return f"""to_char({ident}, 'YYYY-MM-DD"T"HH24:MI:SS.US')""", pa.timestamp("us")
+    if kind == "numeric":
+        if column["precision"] and column["precision"] <= 38:
+            return ident, pa.decimal128(column["precision"], column["scale"])
+        return f"{ident}::float8", pa.float64()
+    simple = {
+        "int2": pa.int16(), "int4": pa.int32(), "int8": pa.int64(),
+        "float4": pa.float32(), "float8": pa.float64(),
+        "bool": pa.bool_(), "date": pa.date32(),
+    }
+    if kind in simple:
+        return ident, simple[kind]
+    return ident, pa.string()
+
+
+def partition_expr(column):
+    ident = quote_ident(column["name"])
+    if column["type"] == "timestamptz":
+        ident = f"({ident} AT TIME ZONE 'UTC')"
+    return f"coalesce(to_char({ident}::date, 'YYYY-MM-DD'), 'unknown')"
+
+
+class ParquetSink:
+    """Buffers batches into row groups and rolls Parquet files into S3."""
+
+    def __init__(self, pa, s3, bucket, base):
+        self.pa = pa
+        self.s3 = s3
+        self.bucket = bucket
+        self.base = base
+        self.files = []
+        self._writer = None
+        self._key = None
+        self._path = None
+        self._partition = None
+        self._buffer = []
+        self._buffered = 0
+        self._file_rows = 0
+
+    def _open(self, partition):
+        directory = f"{self.base}/date={partition}" if partition is not None else self.base
+        index = sum(1 for f in self.files if f["key"].startswith(directory + "/part-"))
+        self._key = f"{directory}/part-{index:05d}.parquet"
+        self._path = f"/tmp/analytics_{uuid.uuid4().hex}.parquet"
+        self._partition = partition
+        self._file_rows = 0
+
+    def write(self, table, partition=None):
+        if self._key is None or partition != self._partition or self._file_rows >= FILE_ROWS:
+            self.close_file()
+            self._open(partition)
+        self._buffer.append(table)
+        self._buffered += table.num_rows
+        self._file_rows += table.num_rows
+        if self._buffered >= ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = self.pa.concat_tables(self._buffer)
+        if self._writer is None:
+            self._writer = self.pa.parquet.ParquetWriter(
+                self._path, table.schema, compression=PARQUET_COMPRESSION
+            )
+        self._writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+        self._buffer = []
+        self._buffered = 0
+
+    def close_file(self):
+        if self._key is None:
+            return
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            size = os.path.getsize(self._path)
+            self.s3.upload_file(self._path, self.bucket, self._key)
+            os.remove(self._path)
+            self.files.append({"key": self._key, "rows": self._file_rows, "size": size})
+        self._writer = None
+        self._key = None
+
+    def discard(self):
+        """Drop the file in progress after a failure."""
+        if self._writer is not None:
+            self._writer.close()
+        if self._path and os.path.exists(self._path):
+            os.remove(self._path)
+
+
+def export_table(s3, db_url, snapshot, bucket, base, table, columns, date_column):
+    """Stream one table through COPY into partitioned Parquet files."""
+    pa = _pyarrow()
+    plans = [column_plan(pa, c) for c in columns]
+    names = [c["name"] for c in columns]
+    select = [expr for expr, _ in plans]
+    types = {name: arrow_type for name, (_, arrow_type) in zip(names, plans)}
+    order = ""
+    if date_column:
+        by_name = {c["name"]: c for c in columns}
+        if date_column not in by_name:
+            raise Exception(f"{table} has no column {date_column}")
+        select.append(f"{partition_expr(by_name[date_column])} AS {PARTITION_COLUMN}")
+        types[PARTITION_COLUMN] = pa.string()
+        order = f" ORDER BY {quote_ident(date_column)} NULLS LAST"
+
+    copy_sql = f"COPY (SELECT {', '.join(select)} FROM {table}{order}) TO STDOUT WITH (FORMAT csv)"
+    proc = subprocess.Popen(
+        ["psql", db_url, "-X", "-q", "-v", "ON_ERROR_STOP=1",
+         "-c", "BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY",
+         "-c", f"SET TRANSACTION SNAPSHOT '{snapshot}'",
+         "-c", copy_sql],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr = []
+    stderr_thread = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+    stderr_thread.start()
+
+    sink = ParquetSink(pa, s3, bucket, f"{base}/{table}")
+    rows = 0
+    try:
+        reader = pa.csv.open_csv(
+            proc.stdout,
+            read_options=pa.csv.ReadOptions(
+                column_names=list(types), block_size=CSV_BLOCK_SIZE
+            ),
+            parse_options=pa.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa.csv.ConvertOptions(
+                column_types=types,
+                true_values=["t"],
+                false_values=["f"],
+                # COPY csv writes NULL unquoted and empty strings as ""
+                null_values=[""],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        for batch in reader:
+            if batch.num_rows == 0:
+                continue
+            rows += batch.num_rows
+            if not date_column:
+                sink.write(pa.Table.from_batches([batch]))
+                continue
+
+            # Rows arrive ordered by date; split the batch where the day changes
+            partitions = batch.column(len(names))
+            n = batch.num_rows
+            changes = pa.compute.indices_nonzero(
+                pa.compute.not_equal(partitions.slice(1), partitions.slice(0, n - 1))
+            ).to_pylist()
+            starts = [0] + [i + 1 for i in changes]
+            for start, end in zip(starts, starts[1:] + [n]):
+                part = pa.Table.from_batches([batch.slice(start, end - start)]).select(names)
+                sink.write(part, partitions[start].as_py())
+        sink.close_file()
+    except Exception:
+        sink.discard()
+        raise
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        stderr_thread.join()
+
+    if proc.returncode != 0:
+        message = b"".join(stderr).decode(errors="replace").strip()
+        raise Exception(f"COPY of {table} failed (exit code {proc.returncode}): {message}")
+
+    return {
+        "rows": rows,
+        "date_column": date_column,
+        "bytes": sum(f["size"] for f in sink.files),
+        "files": sink.files,
+    }
+
+
+def export_analytics(s3, db_url, bucket, prefix, timestamp, tables):
+    """Export ``tables`` ([(table, date_column)]) as Parquet; returns the manifest."""
+    _pyarrow()
+    jobs = int(os.environ.get("ANALYTICS_JOBS", "4"))
+    base = f"{prefix}/analytics/vibrationfit_{timestamp}"
+
+    with PsqlSession(db_url) as session:
+        # Every COPY imports this snapshot, so the tables agree with each other
+        snapshot = session.export_snapshot()
+        columns = {}
+        for table, _ in tables:
+            literal = "'" + table.replace("'", "''") + "'"
+            columns[table] = json.loads(session.query(COLUMNS_SQL.replace("%(table)s", literal)))
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                table: pool.submit(
+                    export_table, s3, db_url, snapshot, bucket, base, table, columns[table], date_column
+                )
+                for table, date_column in tables
+            }
+            exported = {table: future.result() for table, future in futures.items()}
+
+    manifest = {
+        "format": "parquet",
+        "timestamp": timestamp,
+        "tables": {
+            table: {
+                **info,
+                "columns": [{"name": c["name"], "type": c["type"]} for c in columns[table]],
+            }
+            for table, info in exported.items()
+        },
+    }
+    manifest_key = f"{base}/manifest.json"
+    s3.put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest, indent=2).encode())
+
+    total = sum(info["bytes"] for info in exported.values())
+    for table, info in exported.items():
+        print(f"Analytics: {table} {info['rows']:,} rows -> {len(info['files'])} files, "
+              f"{info['bytes'] / (1024 * 1024):.1f} MB")
+    print(f"Uploaded analytics manifest to s3://{bucket}/{manifest_key}")
+
+    return {
+        "manifest_key": manifest_key,
+        "tables": len(exported),
+        "rows": sum(info["rows"] for info in exported.values()),
+        "bytes": total,
+    }
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Backup Throughput Benchmark & Restore Verification
+===================================================
+Runs the backup Lambda's own modes (lambda_function.run_backup with each
+BACKUP_MODE) offline against a local Postgres seeded with synthetic data and
+a local S3 stand-in, then restores what each mode stored through restore.py's
+code paths into a fresh database and compares row counts. incremental and
+dedup run a second time after a small change, the way they run nightly.
+Every backup and restore reports MB/s, peak RSS and peak disk use next to the
+Lambda's own per-phase metrics, so mode / compression / concurrency settings
+can be tuned before they are changed on the Lambda.
+
+Requirements:
+    - PostgreSQL server + client binaries (initdb, pg_ctl, pg_dump, pg_restore, psql)
+    - boto3 and moto[server] (pip3 install boto3 'moto[server]'), or --s3-endpoint
+    - zstd / pigz on PATH to benchmark those compressions
+
+Usage:
+    python3 scripts/aws/db-backup/bench_backup.py [--scale 1] \\
+        [--modes file stream directory incremental dedup] \\
+        [--compressions native zstd pigz] [--jobs 1 4]
+
+    # Use an existing server / S3 stand-in instead of starting them:
+    python3 scripts/aws/db-backup/bench_backup.py --db-url postgresql://localhost/postgres \\
+        --s3-endpoint http://localhost:9000
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from compression import COMPRESSIONS, get_compression
+
+BUCKET = "vibrationfit-backup-bench"
+SOURCE_DB = "bench_source"
+RESTORE_DB = "bench_restore"
+
+# Rows per unit of --scale; shaped like the production tables that dominate the dump
+SEED_SQL = """
+CREATE TABLE user_profiles (
+  id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+  email text NOT NULL,
+  first_name text,
+  profile jsonb,
+  created_at timestamptz NOT NULL,
+  updated_at timestamptz NOT NULL
+);
+INSERT INTO user_profiles (email, first_name, profile, created_at, updated_at)
+SELECT 'user' || g || '@example.com', initcap(md5(g::text)),
+       jsonb_build_object(
+         'has_children', g % 2 = 0,
+         'relationship_status', (ARRAY['Single', 'Married', 'In a Relationship'])[1 + g % 3],
+         'employment_type', (ARRAY['Employee', 'Business Owner', 'Freelancer'])[1 + g % 3]),
+       now() - g * interval '1 minute', now()
+FROM generate_series(1, {users}) g;
+
+CREATE TABLE token_usage (
+  id bigserial PRIMARY KEY,
+  user_id uuid,
+  action_type text,
+  model_used text,
+  input_tokens int,
+  output_tokens int,
+  cost_estimate numeric(12, 6),
+  metadata jsonb,
+  created_at timestamptz NOT NULL
+);
+INSERT INTO token_usage (user_id, action_type, model_used, input_tokens, output_tokens,
+                         cost_estimate, metadata, created_at)
+SELECT gen_random_uuid(), (ARRAY['chat', 'vision_refinement', 'audio_generation'])[1 + g % 3],
+       (ARRAY['gpt-4o', 'gpt-4o-mini', 'tts-1'])[1 + g % 3],
+       (random() * 4000)::int, (random() * 1500)::int, random() / 10,
+       jsonb_build_object('request_id', md5(g::text)),
+       now() - g * interval '10 seconds'
+FROM generate_series(1, {usage}) g;
+CREATE INDEX token_usage_created_at_idx ON token_usage (created_at);
+
+CREATE TABLE journal_entries (
+  id bigserial PRIMARY KEY,
+  user_id uuid,
+  title text,
+  content text,
+  created_at timestamptz NOT NULL
+);
+INSERT INTO journal_entries (user_id, title, content, created_at)
+SELECT gen_random_uuid(), 'Entry ' || g, repeat(md5(g::text) || ' ', 1 + g % 40),
+       now() - g * interval '1 hour'
+FROM generate_series(1, {journal}) g;
+
+CREATE TABLE audio_tracks (
+  id serial PRIMARY KEY,
+  name text,
+  url text,
+  duration_seconds int
+);
+INSERT INTO audio_tracks (name, url, duration_seconds)
+SELECT 'Track ' || g, 'https://media.example.com/audio/' || g || '.mp3', 60 + g
+FROM generate_series(1, 50) g;
+
+ANALYZE;
+"""
+
+SCALE_ROWS = {"users": 20_000, "usage": 200_000, "journal": 50_000}
+
+# The change between the two runs of incremental / dedup. user_profiles has
+# updated_at, so the incremental fingerprint sees it inside the snapshot.
+TOUCH_SQL = """
+INSERT INTO user_profiles (email, first_name, created_at, updated_at)
+SELECT 'new' || g || '@example.com', 'New', now(), now() FROM generate_series(1, 100) g;
+UPDATE journal_entries SET content = content || ' (edited)' WHERE id % 1000 = 0;
+"""
+
+# lambda_function.BACKUP_MODES (imported once the S3 stand-in is running)
+MODES = ["file", "stream", "directory", "incremental", "dedup"]
+PG_DUMP_COMPRESSION_MODES = {"directory", "incremental"}
+RERUN_MODES = {"incremental", "dedup"}
+# Every concurrency knob the modes read, all set to --jobs
+JOB_SETTINGS = ["DUMP_JOBS", "DIRECTORY_UPLOAD_CONCURRENCY", "STREAM_UPLOAD_CONCURRENCY",
+                "INCREMENTAL_JOBS", "DEDUP_UPLOAD_CONCURRENCY"]
+
+
+# ---------------------------------------------------------------------------
+# Local services
+# ---------------------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_postgres(work_dir: Path):
+    """initdb + pg_ctl a throwaway cluster; returns (base_url, stop)."""
+    data_dir = work_dir / "pgdata"
+    port = free_port()
+    for cmd in (
+        ["initdb", "-D", str(data_dir), "-A", "trust", "-U", "postgres", "--no-sync"],
+        ["pg_ctl", "-D", str(data_dir), "-l", str(work_dir / "postgres.log"), "-w", "start",
+         "-o", f"-p {port} -k {work_dir} -c listen_addresses='' -c fsync=off"],
+    ):
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"  ERROR: {cmd[0]} failed:\n{result.stderr[-500:]}")
+            sys.exit(1)
+
+    def stop():
+        subprocess.run(["pg_ctl", "-D", str(data_dir), "-m", "immediate", "stop"],
+                       capture_output=True)
+
+    return f"postgresql://postgres@/{{db}}?host={work_dir}&port={port}", stop
+
+
+def start_local_s3():
+    """Start an in-process moto S3 server; returns (endpoint, stop)."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        print("  ERROR: moto not installed. Run: pip3 install 'moto[server]' (or pass --s3-endpoint)")
+        sys.exit(1)
+
+    # One access-log line per request would drown the report
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    return f"http://127.0.0.1:{port}", server.stop
+
+
+def psql(db_url: str, sql: str) -> str:
+    result = subprocess.run(
+        ["psql", db_url, "-X", "-q", "-A", "-t", "-v", "ON_ERROR_STOP=1", "-c", sql],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(f"  ERROR: psql failed:\n{result.stderr[-500:]}")
+        sys.exit(1)
+    return result.stdout
+
+
+def row_counts(db_url: str) -> dict:
+    tables = psql(db_url, "SELECT format('%I.%I', schemaname, relname) FROM pg_stat_user_tables")
+    return {
+        table: int(psql(db_url, f"SELECT count(*) FROM {table}").strip())
+        for table in tables.split()
+    }
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _descendants(root: int) -> list:
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    found, frontier = [root], [root]
+    while frontier:
+        frontier = [pid for pid, ppid in parents.items() if ppid in frontier]
+        found += frontier
+    return found
+
+
+def _rss(pids: list) -> int:
+    page = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def _disk(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_blocks * 512
+            except OSError:
+                continue
+    return total
+
+
+class Phase:
+    """Times a phase and samples peak RSS (this process + children) and disk use."""
+
+    def __init__(self, name: str, scratch: Path):
+        self.name = name
+        self.scratch = scratch
+        self.bytes = 0
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        have_proc = os.path.isdir("/proc")
+        while True:
+            if have_proc:
+                self.peak_rss = max(self.peak_rss, _rss(_descendants(os.getpid())))
+            self.peak_disk = max(self.peak_disk, _disk(self.scratch))
+            if self._stop.wait(0.05):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.monotonic() - self._start
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def result(self) -> dict:
+        mb = self.bytes / (1024 * 1024)
+        return {
+            "phase": self.name,
+            "seconds": round(self.seconds, 3),
+            "mb": round(mb, 2),
+            "mb_per_s": round(mb / self.seconds, 1) if self.seconds else None,
+            "peak_rss_mb": round(self.peak_rss / (1024 * 1024), 1),
+            "peak_disk_mb": round(self.peak_disk / (1024 * 1024), 1),
+        }
+
+
+def stored_size(s3, prefix: str) -> int:
+    """Bytes the configuration left in S3 (every run, every object)."""
+    paginator = s3.get_paginator("list_objects_v2")
+    return sum(
+        obj["Size"]
+        for page in paginator.paginate(Bucket=BUCKET, Prefix=f"{prefix}/")
+        for obj in page.get("Contents", [])
+    )
+
+
+# ---------------------------------------------------------------------------
+# One configuration
+# ---------------------------------------------------------------------------
+
+def restore_backup(lam, restore, mode: str, result: dict, prefix: str, restore_url: str,
+                   scratch: Path, jobs: int) -> None:
+    """Restore what ``mode`` stored, through the same code paths as restore.py."""
+    args = argparse.Namespace(
+        db_url=restore_url, jobs=jobs, concurrency=max(jobs, 1) * 2, target_dir=str(scratch),
+        download_only=False, at=None, output=None,
+    )
+    if mode == "directory":
+        args.source = f"s3://{BUCKET}/{result['s3_key']}"
+        restore.restore_directory(args)
+    elif mode == "incremental":
+        args.source = f"s3://{BUCKET}/{prefix}/"
+        restore.restore_incremental(args)
+    elif mode == "dedup":
+        args.source = f"s3://{BUCKET}/{prefix}/"
+        restore.restore_dedup(args)
+    else:
+        # file / stream: one object, possibly compressed by a stream compressor
+        scratch.mkdir(parents=True, exist_ok=True)
+        path = scratch / os.path.basename(result["s3_key"])
+        lam.s3.download_file(BUCKET, result["s3_key"], str(path))
+        if result.get("sha256") and restore.file_sha256(str(path)) != result["sha256"]:
+            raise Exception(f"Checksum mismatch for {result['s3_key']}")
+        if path.suffix in (".gz", ".zst"):
+            tool = ["zstd", "-d", "-q", "-c"] if path.suffix == ".zst" else ["gzip", "-d", "-c"]
+            decompressed = scratch / "backup.dump"
+            with open(decompressed, "wb") as f_out:
+                subprocess.run([*tool, str(path)], stdout=f_out, check=True)
+            path.unlink()
+            path = decompressed
+        restore.run_pg_restore(restore_url, "-j", str(jobs), str(path))
+
+
+def run_config(lam, restore, base_url: str, scratch: Path, mode: str, compression_name: str,
+               jobs: int) -> dict:
+    compression = get_compression(compression_name)
+    label = f"{mode}/{compression_name}/j{jobs}"
+    print(f"\n--- {label} ---")
+    scratch.mkdir(parents=True, exist_ok=True)
+    source_url = base_url.format(db=SOURCE_DB)
+    restore_url = base_url.format(db=RESTORE_DB)
+    prefix = f"bench/{label}"
+    for name in JOB_SETTINGS:
+        os.environ[name] = str(jobs)
+    # The Lambda stages in tempfile.gettempdir(); keep that inside scratch so it's measured
+    tempfile.tempdir = str(scratch)
+
+    # incremental and dedup are run twice, the second time after a small
+    # change, to measure the change-only backup that runs every night
+    phases = []
+    try:
+        for run in range(2 if mode in RERUN_MODES else 1):
+            if run:
+                psql(source_url, TOUCH_SQL)
+            with Phase("backup" if not run else "rebackup", scratch) as phase:
+                result = lam.run_backup(
+                    lambda: source_url, BUCKET, prefix, f"20250101_{run:06d}", mode, compression, None,
+                )
+                phase.bytes = result["metrics"]["phases"].get("dump", {}).get("bytes", 0)
+            phases.append(phase.result())
+            if not run:
+                dump_bytes = phase.bytes
+                lambda_phases = result["metrics"]["phases"]
+    finally:
+        tempfile.tempdir = None
+    stored_bytes = stored_size(lam.s3, prefix)
+    shutil.rmtree(scratch)
+
+    psql(base_url.format(db="postgres"), f"DROP DATABASE IF EXISTS {RESTORE_DB}")
+    psql(base_url.format(db="postgres"), f"CREATE DATABASE {RESTORE_DB}")
+    with Phase("restore", scratch) as phase:
+        restore_backup(lam, restore, mode, result, prefix, restore_url, scratch / "restore", jobs)
+        phase.bytes = dump_bytes
+    phases.append(phase.result())
+
+    source_counts = row_counts(source_url)
+    restored_counts = row_counts(restore_url)
+    mismatches = {
+        table: {"source": count, "restored": restored_counts.get(table)}
+        for table, count in source_counts.items()
+        if restored_counts.get(table) != count
+    }
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    for p in phases:
+        print(f"  {p['phase']:<11} {p['seconds']:>8.2f}s {p['mb']:>9.1f} MB "
+              f"{p['mb_per_s'] or 0:>8.1f} MB/s  rss {p['peak_rss_mb']:>7.1f} MB  "
+              f"disk {p['peak_disk_mb']:>8.1f} MB")
+    print(f"  stored {stored_bytes / (1024 * 1024):.1f} MB in S3")
+    print(f"  verify: {'OK' if not mismatches else f'MISMATCH {mismatches}'}")
+
+    return {
+        "config": label,
+        "mode": mode,
+        "compression": compression_name,
+        "jobs": jobs,
+        "dump_bytes": dump_bytes,
+        "stored_bytes": stored_bytes,
+        "total_seconds": round(sum(p["seconds"] for p in phases), 3),
+        "phases": phases,
+        "lambda_phases": lambda_phases,
+        "verified": not mismatches,
+        "mismatches": mismatches,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def write_report(results: list, path: Path) -> None:
+    with open(path.with_suffix(".json"), "w") as f:
+        json.dump(results, f, indent=2)
+
+    lines = [
+        "# Backup Benchmark",
+        "",
+        "| Config | Stored MB | Backup s | Re-run s | Dump MB/s | Upload MB/s | Restore MB/s | Peak RSS MB | Peak disk MB | Verified |",
+        "|--------|-----------|----------|----------|-----------|-------------|--------------|-------------|--------------|----------|",
+    ]
+    for r in results:
+        by_phase = {p["phase"]: p for p in r["phases"]}
+        rerun = f"{by_phase['rebackup']['seconds']:.1f}" if "rebackup" in by_phase else "—"
+        lines.append(
+            f"| {r['config']} | {r['stored_bytes'] / (1024 * 1024):.1f} "
+            f"| {by_phase['backup']['seconds']:.1f} | {rerun} "
+            f"| {r['lambda_phases'].get('dump', {}).get('mb_per_s')} "
+            f"| {r['lambda_phases'].get('upload', {}).get('mb_per_s')} "
+            f"| {by_phase['restore']['mb_per_s']} "
+            f"| {max(p['peak_rss_mb'] for p in r['phases'])} "
+            f"| {max(p['peak_disk_mb'] for p in r['phases'])} "
+            f"| {'✅' if r['verified'] else '❌'} |"
+        )
+    with open(path.with_suffix(".md"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def load_backup_modules(endpoint: str):
+    """Import the Lambda and restore.py; both create their S3 client at import time."""
+    os.environ["S3_ENDPOINT_URL"] = endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import lambda_function
+    import restore
+
+    return lambda_function, restore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backup/restore throughput offline")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Synthetic data scale (1 ≈ 270k rows, ~100 MB dump)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES,
+                        help="Lambda backup modes (BACKUP_MODE) to run")
+    parser.add_argument("--compressions", nargs="+", choices=list(COMPRESSIONS),
+                        default=["native", "zstd", "pigz"])
+    parser.add_argument("--jobs", nargs="+", type=int, default=[1, 4],
+                        help="DUMP_JOBS / upload concurrency / pg_restore -j")
+    parser.add_argument("--db-url",
+                        help="Existing server to use (database name is replaced); default: start one")
+    parser.add_argument("--s3-endpoint", help="Existing S3 stand-in; default: start moto")
+    parser.add_argument("--report", default="backup_benchmark", help="Report path (.json and .md)")
+    args = parser.parse_args()
+
+    try:
+        import boto3  # noqa: F401
+    except ImportError:
+        print("ERROR: boto3 not installed. Run: pip3 install boto3")
+        sys.exit(1)
+
+    work_dir = Path(tempfile.mkdtemp(prefix="vf_backup_bench_"))
+    stops = []
+    try:
+        if args.db_url:
+            scheme, _, rest = args.db_url.partition("://")
+            authority, _, query = rest.partition("/")
+            query = query.partition("?")[2]
+            base_url = f"{scheme}://{authority}/{{db}}" + (f"?{query}" if query else "")
+        else:
+            print("Starting local Postgres...")
+            base_url, stop = start_local_postgres(work_dir)
+            stops.append(stop)
+
+        endpoint = args.s3_endpoint
+        if not endpoint:
+            print("Starting local S3 (moto)...")
+            endpoint, stop = start_local_s3()
+            stops.append(stop)
+        lam, restore = load_backup_modules(endpoint)
+        lam.s3.create_bucket(Bucket=BUCKET)
+
+        rows = {k: int(v * args.scale) for k, v in SCALE_ROWS.items()}
+        print(f"Seeding {sum(rows.values()):,} rows (scale {args.scale})...")
+        admin_url = base_url.format(db="postgres")
+        psql(admin_url, f"DROP DATABASE IF EXISTS {SOURCE_DB}")
+        psql(admin_url, f"CREATE DATABASE {SOURCE_DB}")
+        psql(base_url.format(db=SOURCE_DB), SEED_SQL.format(**rows))
+
+        results = []
+        for mode in args.modes:
+            for compression in args.compressions:
+                stream_compressor = (COMPRESSIONS[compression].get("command")
+                                     or COMPRESSIONS[compression].get("python_gzip"))
+                if mode in PG_DUMP_COMPRESSION_MODES and stream_compressor:
+                    continue
+                # dedup always dumps with -Z 0 and compresses chunks itself
+                if mode == "dedup" and compression != args.compressions[0]:
+                    continue
+                for jobs in args.jobs:
+                    results.append(run_config(
+                        lam, restore, base_url, work_dir / "scratch", mode, compression, jobs
+                    ))
+
+        report = Path(args.report)
+        write_report(results, report)
+        print(f"\nReport: {report.with_suffix('.md')} / {report.with_suffix('.json')}")
+        if not all(r["verified"] for r in results):
+            sys.exit(1)
+    finally:
+        for stop in reversed(stops):
+            stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Deduplicating chunk store for database backups.
+
+An uncompressed dump stream is split into content-defined chunks. Each chunk
+is stored once, zlib-compressed, under its SHA-256; a backup is just an index
+listing its chunk hashes in order. Unchanged table data produces the same
+chunks night after night, so only changed regions are uploaded and stored.
+
+Layout under ``{prefix}/dedup/``:
+    chunks/<hh>/<sha256>                compressed chunk
+    indexes/vibrationfit_<ts>.json      ordered chunk list for one backup
+    in-progress/vibrationfit_<ts>.json  marker while that backup is running
+
+Garbage collection (run after each backup when DEDUP_RETENTION is set, or
+manually):
+    python3 chunkstore.py gc s3://BUCKET/db-backups/ --retention daily=7,weekly=4,monthly=6
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Candidate cut points are line ends: the custom-format archive stores table
+# data as COPY text, one row per line. A cut is taken after a line when a
+# CRC of its tail falls below a threshold proportional to the line length,
+# giving ~AVG_CHUNK_SIZE chunks whose boundaries depend only on local content
+# (an insert or update shifts at most the chunks around it). A per-byte
+# rolling hash in pure Python would be ~50x slower in the Lambda.
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+WINDOW = 64
+READ_SIZE = 4 * 1024 * 1024
+
+
+def iter_chunks(source):
+    """Yield content-defined chunks (bytes) from a binary file-like ``source``."""
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < MAX_CHUNK_SIZE:
+            data = source.read(READ_SIZE)
+            if not data:
+                eof = True
+            buffer += data
+        if not buffer:
+            return
+
+        cut = _find_cut(buffer) if len(buffer) > MIN_CHUNK_SIZE else None
+        if cut is None:
+            if eof and len(buffer) <= MAX_CHUNK_SIZE:
+                cut = len(buffer)
+            else:
+                cut = min(len(buffer), MAX_CHUNK_SIZE)
+
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+
+
+def _find_cut(buffer):
+    """Offset just past the first qualifying line end, or None."""
+    limit = min(len(buffer), MAX_CHUNK_SIZE)
+    line_start = buffer.rfind(b"\n", 0, MIN_CHUNK_SIZE) + 1
+    pos = buffer.find(b"\n", MIN_CHUNK_SIZE, limit)
+    while pos != -1:
+        line_len = pos + 1 - line_start
+        tail = buffer[max(line_start, pos - WINDOW):pos]
+        if zlib.crc32(tail) % AVG_CHUNK_SIZE < line_len:
+            return pos + 1
+        line_start = pos + 1
+        pos = buffer.find(b"\n", line_start, limit)
+    return None
+
+
+def chunk_key(base, digest):
+    return f"{base}/chunks/{digest[:2]}/{digest}"
+
+
+def list_keys(s3, bucket, prefix):
+    """Yield (key, last_modified) for every object under ``prefix``."""
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["LastModified"]
+
+
+def load_index(s3, bucket, key):
+    return json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+
+def referenced_chunks(s3, bucket, base):
+    """Chunks referenced by any index currently in the store."""
+    known = set()
+    for key, _ in list_keys(s3, bucket, f"{base}/indexes/"):
+        known.update(digest for digest, _ in load_index(s3, bucket, key)["chunks"])
+    return known
+
+
+def marker_key(base, name):
+    return f"{base}/in-progress/{name}.json"
+
+
+def release_marker(s3, bucket, base, name):
+    """Remove a backup's in-progress marker (after its index is saved, or on failure)."""
+    s3.delete_object(Bucket=bucket, Key=marker_key(base, name))
+
+
+def store_stream(s3, bucket, base, name, source, concurrency=8):
+    """Chunk ``source`` and upload chunks the store doesn't have yet.
+
+    Chunks already in the store are reused without being uploaded again, so
+    their LastModified says nothing about this backup. An in-progress marker
+    is written *before* the existing indexes are read, and garbage collection
+    leaves chunks alone while a fresh marker exists (see ``collect_garbage``).
+
+    Returns the backup's index; publish it with ``save_index()`` once the
+    producer of ``source`` has exited successfully, or call
+    ``release_marker()`` if it failed.
+    """
+    s3.put_object(
+        Bucket=bucket, Key=marker_key(base, name),
+        Body=json.dumps({"name": name, "started": datetime.now(timezone.utc).isoformat()}).encode(),
+    )
+    try:
+        return _store_chunks(s3, bucket, base, name, source, concurrency)
+    except Exception:
+        release_marker(s3, bucket, base, name)
+        raise
+
+
+def _store_chunks(s3, bucket, base, name, source, concurrency):
+    known = referenced_chunks(s3, bucket, base)
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+    chunks = []
+    stats = {"total_bytes": 0, "new_chunks": 0, "new_bytes": 0, "stored_bytes": 0}
+
+    def upload(digest, data):
+        try:
+            body = zlib.compress(data, 6)
+            s3.put_object(Bucket=bucket, Key=chunk_key(base, digest), Body=body)
+            return len(body)
+        finally:
+            in_flight.release()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for data in iter_chunks(source):
+            digest = hashlib.sha256(data).hexdigest()
+            chunks.append([digest, len(data)])
+            stats["total_bytes"] += len(data)
+            if digest in known:
+                continue
+            known.add(digest)
+            stats["new_chunks"] += 1
+            stats["new_bytes"] += len(data)
+            in_flight.acquire()  # bounds buffered chunk memory
+            futures.append(pool.submit(upload, digest, data))
+        stats["stored_bytes"] = sum(f.result() for f in futures)
+
+    return {"name": name, "chunks": chunks, **stats}
+
+
+def save_index(s3, bucket, base, index):
+    """Publish a backup's index and drop its in-progress marker."""
+    index_key = f"{base}/indexes/{index['name']}.json"
+    s3.put_object(Bucket=bucket, Key=index_key, Body=json.dumps(index).encode())
+    release_marker(s3, bucket, base, index["name"])
+    return index_key
+
+
+def restore_stream(s3, bucket, base, index, write, concurrency=8):
+    """Fetch an index's chunks in parallel and ``write()`` them back in order."""
+
+    def fetch(entry):
+        digest, size = entry
+        data = zlib.decompress(s3.get_object(Bucket=bucket, Key=chunk_key(base, digest))["Body"].read())
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise Exception(f"Chunk {digest} is corrupt")
+        return data
+
+    chunks = index["chunks"]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # Keep a bounded read-ahead window so memory doesn't grow with the dump
+        window = concurrency * 2
+        pending = [pool.submit(fetch, entry) for entry in chunks[:window]]
+        for i in range(len(chunks)):
+            data = pending[i].result()
+            pending[i] = None
+            if i + window < len(chunks):
+                pending.append(pool.submit(fetch, chunks[i + window]))
+            write(data)
+
+
+# ---------------------------------------------------------------------------
+# Garbage collection
+# ---------------------------------------------------------------------------
+
+def parse_retention(spec):
+    """'daily=7,weekly=4,monthly=6' -> {'daily': 7, 'weekly': 4, 'monthly': 6}"""
+    policy = {"daily": 0, "weekly": 0, "monthly": 0}
+    for part in filter(None, spec.split(",")):
+        period, _, count = part.partition("=")
+        if period.strip() not in policy:
+            raise ValueError(f"Unknown retention period: {period}")
+        policy[period.strip()] = int(count)
+    return policy
+
+
+def select_retained(names, policy):
+    """Keep the newest backup of each of the last N days / ISO weeks / months."""
+    def timestamp(name):
+        return datetime.strptime(name[-len("YYYYMMDD_HHMMSS"):], "%Y%m%d_%H%M%S")
+
+    buckets = {
+        "daily": lambda t: t.strftime("%Y-%m-%d"),
+        "weekly": lambda t: "%d-W%02d" % t.isocalendar()[:2],
+        "monthly": lambda t: t.strftime("%Y-%m"),
+    }
+    ordered = sorted(names, key=timestamp, reverse=True)
+    keep = set(ordered[:1])  # never delete the newest backup
+    for period, count in policy.items():
+        seen = []
+        for name in ordered:
+            bucket = buckets[period](timestamp(name))
+            if bucket in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.append(bucket)
+            keep.add(name)
+    return keep
+
+
+def collect_garbage(s3, bucket, base, policy, grace_hours=24, dry_run=False):
+    """Delete indexes outside the retention policy, then unreferenced chunks.
+
+    A running backup reuses chunks it found through the indexes it read at
+    its start, without uploading them again, so chunk age alone can't protect
+    them. The steps are ordered against ``store_stream`` (marker, then read
+    indexes) and ``save_index`` (write index, then drop marker):
+
+    1. Delete the expired indexes.
+    2. If any in-progress marker is younger than ``grace_hours``, stop here.
+       A backup that writes its marker after this check reads the indexes
+       after step 1, so it can't pick up chunks of an expired index.
+    3. Re-list the indexes, so a backup that finished since the start of the
+       run counts, and delete chunks none of them references. Chunks younger
+       than ``grace_hours`` are kept too: a backup that started after step 2
+       may have just uploaded them.
+
+    Markers older than ``grace_hours`` belong to runs that died before
+    saving their index; they are deleted and ignored.
+    """
+    def delete(keys):
+        for i in range(0, len(keys), 1000):
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={"Objects": [{"Key": k} for k in keys[i:i + 1000]], "Quiet": True},
+            )
+
+    index_keys = [key for key, _ in list_keys(s3, bucket, f"{base}/indexes/")]
+    names = {os.path.basename(key)[: -len(".json")]: key for key in index_keys}
+    retained = select_retained(list(names), policy)
+    expired = [names[n] for n in names if n not in retained]
+    if not dry_run:
+        delete(expired)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=grace_hours)
+    markers = list(list_keys(s3, bucket, f"{base}/in-progress/"))
+    running = [key for key, modified in markers if modified >= cutoff]
+    stale = [key for key, modified in markers if modified < cutoff]
+    if not dry_run:
+        delete(stale)
+
+    orphaned = []
+    if running:
+        print(f"GC: {len(running)} backup(s) in progress, not deleting chunks")
+    else:
+        # In a dry run the expired indexes are still listed; leave them out
+        referenced = set()
+        for key, _ in list_keys(s3, bucket, f"{base}/indexes/"):
+            if key not in expired:
+                referenced.update(digest for digest, _ in load_index(s3, bucket, key)["chunks"])
+        orphaned = [
+            key for key, modified in list_keys(s3, bucket, f"{base}/chunks/")
+            if os.path.basename(key) not in referenced and modified < cutoff
+        ]
+        if not dry_run:
+            delete(orphaned)
+
+    print(f"GC: kept {len(retained)} backups, deleted {len(expired)} indexes "
+          f"and {len(orphaned)} chunks{' (dry run)' if dry_run else ''}")
+    return {
+        "retained": sorted(retained),
+        "deleted_indexes": len(expired),
+        "deleted_chunks": len(orphaned),
+        "skipped_chunks": bool(running),
+    }
+
+
+def main():
+    import boto3
+
+    parser = argparse.ArgumentParser(description="Deduplicated backup chunk store maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc = subparsers.add_parser("gc", help="Apply the retention policy and delete unreferenced chunks")
+    gc.add_argument("source", help="s3://bucket/prefix/ (the Lambda's S3_PREFIX)")
+    gc.add_argument("--retention", default="daily=7,weekly=4,monthly=6")
+    gc.add_argument("--grace-hours", type=float, default=24)
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
+    bucket, _, prefix = args.source[len("s3://"):].partition("/")
+    collect_garbage(s3, bucket, f"{prefix.rstrip('/')}/dedup", parse_retention(args.retention),
+                    args.grace_hours, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
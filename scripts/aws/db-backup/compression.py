@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Backup compression options.
+
+`pg_dump -F c` already zlib-compresses every data block, so gzipping the
+archive again costs a full single-threaded pass for almost no size gain.
+Each option below compresses exactly once, either inside pg_dump or on the
+stream with pg_dump's own compression disabled (-Z 0).
+
+Benchmark every option against a real database:
+    python3 compression.py "postgresql://..." [--only zstd pigz native]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+from pgdump import PgDump
+
+CHUNK_SIZE = 1024 * 1024
+THREADS = os.environ.get("COMPRESS_THREADS", str(os.cpu_count() or 2))
+
+COMPRESSIONS = {
+    # pg_dump's built-in per-block zlib; uploaded as-is
+    "native": {"pg_dump_args": [], "suffix": ".dump"},
+    # Legacy double compression: zlib inside pg_dump, gzip on top
+    "gzip": {"pg_dump_args": [], "python_gzip": True, "suffix": ".dump.gz"},
+    # Multi-threaded zstd on an uncompressed archive
+    "zstd": {
+        "pg_dump_args": ["-Z", "0"],
+        "command": ["zstd", "-q", "-c", f"-T{THREADS}",
+                    f"-{os.environ.get('ZSTD_LEVEL', '3')}"],
+        "suffix": ".dump.zst",
+    },
+    # Block-parallel gzip; output is a standard .gz any gunzip can read
+    "pigz": {
+        "pg_dump_args": ["-Z", "0"],
+        "command": ["pigz", "-c", "-p", THREADS],
+        "suffix": ".dump.gz",
+    },
+    # pg_dump >= 16 native algorithms (per-block, so the archive stays seekable)
+    "native-lz4": {"pg_dump_args": ["-Z", "lz4"], "suffix": ".dump"},
+    "native-zstd": {"pg_dump_args": ["-Z", "zstd"], "suffix": ".dump"},
+    # Uncompressed archive
+    "none": {"pg_dump_args": ["-Z", "0"], "suffix": ".dump"},
+}
+
+DEFAULT_COMPRESSION = "native"
+
+
+def get_compression(name=None):
+    name = name or os.environ.get("BACKUP_COMPRESSION", DEFAULT_COMPRESSION)
+    if name not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown compression: {name} (choose from {', '.join(COMPRESSIONS)})"
+        )
+    return {"name": name, **COMPRESSIONS[name]}
+
+
+def require_pg_dump_compression(compression, mode):
+    """Modes that write several archives can only use pg_dump's own compression."""
+    if compression.get("command") or compression.get("python_gzip"):
+        raise ValueError(
+            f"Compression '{compression['name']}' is not supported in {mode} mode "
+            "(use native, native-lz4, native-zstd or none)"
+        )
+
+
+def compress_stream(source, write, compression):
+    """Copy ``source`` to ``write()`` applying the stream compressor, if any.
+
+    Returns the number of uncompressed bytes read from ``source``.
+    """
+    if compression.get("command"):
+        return _compress_external(source, write, compression["command"])
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compression.get("python_gzip") else None
+    total = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        write(compressor.compress(chunk) if compressor else chunk)
+    if compressor:
+        write(compressor.flush())
+    return total
+
+
+def _compress_external(source, write, command):
+    """Feed ``source`` through an external compressor process."""
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    counted = {"bytes": 0, "error": None}
+
+    def feed():
+        try:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                counted["bytes"] += len(chunk)
+                proc.stdin.write(chunk)
+        except Exception as e:
+            counted["error"] = e
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError as e:
+                counted["error"] = counted["error"] or e
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    try:
+        while True:
+            chunk = proc.stdout.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            write(chunk)
+    except BaseException:
+        # Nothing drains stdout any more, so the compressor would block on it
+        # and the feeder on its stdin; kill it so both fail fast
+        proc.kill()
+        proc.stdout.close()
+        raise
+    finally:
+        feeder.join()
+        returncode = proc.wait()
+
+    if counted["error"]:
+        raise counted["error"]
+    if returncode != 0:
+        raise Exception(f"{command[0]} failed with exit code {returncode}")
+    return counted["bytes"]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def benchmark(db_url, names):
+    """Dump the database once per option and report throughput and ratio."""
+    # Baseline: uncompressed archive size, used as the "raw" size for every option
+    print("Measuring uncompressed dump size...")
+    raw = _timed_dump(db_url, get_compression("none"))
+    raw_bytes = raw["output_bytes"]
+    print(f"  {raw_bytes / (1024 * 1024):.1f} MB uncompressed in {raw['seconds']:.1f}s\n")
+
+    print(f"{'option':<12} {'output MB':>10} {'ratio':>7} {'seconds':>8} {'MB/s':>8}")
+    results = []
+    for name in names:
+        try:
+            run = _timed_dump(db_url, get_compression(name))
+        except Exception as e:
+            print(f"{name:<12} FAILED: {e}")
+            continue
+        ratio = raw_bytes / run["output_bytes"] if run["output_bytes"] else 0
+        mb_per_s = raw_bytes / (1024 * 1024) / run["seconds"] if run["seconds"] else 0
+        results.append({"option": name, "ratio": ratio, "mb_per_s": mb_per_s, **run})
+        print(f"{name:<12} {run['output_bytes'] / (1024 * 1024):>10.1f} "
+              f"{ratio:>7.2f} {run['seconds']:>8.1f} {mb_per_s:>8.1f}")
+    return results
+
+
+def _timed_dump(db_url, compression):
+    output = {"bytes": 0}
+
+    def count(chunk):
+        output["bytes"] += len(chunk)
+
+    start = time.monotonic()
+    with PgDump(db_url, "-F", "c", "--no-owner", "--no-acl",
+                *compression["pg_dump_args"], timeout=3600) as dump:
+        compress_stream(dump.stdout, count, compression)
+        dump.wait()
+    return {"output_bytes": output["bytes"], "seconds": time.monotonic() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backup compression options")
+    parser.add_argument("db_url", help="PostgreSQL connection string to dump")
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(COMPRESSIONS),
+        default=[n for n in COMPRESSIONS if n != "none"],
+        help="Options to benchmark (default: all)",
+    )
+    args = parser.parse_args()
+
+    if not benchmark(args.db_url, args.only):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
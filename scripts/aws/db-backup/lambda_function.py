@@ -1,65 +1,497 @@
-import subprocess
 import boto3
+import hashlib
+import json
 import os
-import gzip
 import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 
-s3 = boto3.client("s3")
+from analytics import export_analytics, parse_tables
+from chunkstore import collect_garbage, parse_retention, release_marker, save_index, store_stream
+from compression import compress_stream, get_compression, require_pg_dump_compression
+from incremental import backup_incremental
+from metrics import BackupMetrics
+from multipart import MultipartUploader
+from pgdump import PgDump
+from tocindex import build_index
+
+s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
 secrets = boto3.client("secretsmanager")
 
 
-def get_db_url():
-    secret_id = os.environ.get("DB_SECRET_ID", "vibrationfit/supabase-db-url")
-    response = secrets.get_secret_value(SecretId=secret_id)
+DEFAULT_SECRET_ID = os.environ.get("DB_SECRET_ID", "vibrationfit/supabase-db-url")
+
+
+def get_db_url(secret_id=None):
+    response = secrets.get_secret_value(SecretId=secret_id or DEFAULT_SECRET_ID)
     return response["SecretString"]
 
 
-def handler(event, context):
-    bucket = os.environ["S3_BUCKET"]
-    prefix = os.environ.get("S3_PREFIX", "db-backups")
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+class SecretCache:
+    """Fetches each secret once per invocation, shared by concurrent targets."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, secret_id):
+        with self._lock:
+            if secret_id not in self._values:
+                self._values[secret_id] = get_db_url(secret_id)
+            return self._values[secret_id]
+
+
+def schema_args(schemas):
+    return [arg for schema in schemas or [] for arg in ("-n", schema)]
+
 
-    dump_path = f"/tmp/vibrationfit_{timestamp}.dump"
-    gz_path = f"{dump_path}.gz"
+def dump_args(compression, schemas=None):
+    return ["-F", "c", "--no-owner", "--no-acl", *compression["pg_dump_args"], *schema_args(schemas)]
 
-    db_url = get_db_url()
 
-    print(f"Starting database backup at {timestamp}")
-    print(f"Target: s3://{bucket}/{prefix}/")
+def backup_to_file(db_url, bucket, prefix, timestamp, compression, metrics, schemas=None):
+    """Dump (and compress, in one pass) to a single /tmp file, then upload."""
+    # Concurrent targets share /tmp, so every run gets its own directory
+    work_dir = tempfile.mkdtemp(prefix="vibrationfit_")
+    dump_path = f"{work_dir}/vibrationfit_{timestamp}{compression['suffix']}"
 
-    result = subprocess.run(
-        ["pg_dump", db_url, "-F", "c", "-f", dump_path, "--no-owner", "--no-acl"],
-        capture_output=True,
-        text=True,
-        timeout=240,
-    )
+    try:
+        with PgDump(db_url, *dump_args(compression, schemas)) as dump:
+            with open(dump_path, "wb") as f_out:
+                with metrics.pipeline(dump.stdout, f_out.write, write_phase="write") as (source, write):
+                    dump_size = compress_stream(source, write, compression)
+            dump.wait()
 
-    if result.returncode != 0:
-        print(f"pg_dump stderr: {result.stderr}")
-        raise Exception(f"pg_dump failed with exit code {result.returncode}")
+        compressed_size = os.path.getsize(dump_path)
+        print(f"Dump complete: {dump_size / (1024 * 1024):.1f} MB")
+        print(f"Compressed ({compression['name']}): {compressed_size / (1024 * 1024):.1f} MB")
+
+        s3_key = f"{prefix}/vibrationfit_{timestamp}{compression['suffix']}"
+        with metrics.phase("upload") as phase:
+            s3.upload_file(dump_path, bucket, s3_key)
+            phase["bytes"] = compressed_size
+        print(f"Uploaded to s3://{bucket}/{s3_key}")
+
+        result = {
+            "s3_key": s3_key,
+            "dump_size_mb": round(dump_size / (1024 * 1024), 1),
+            "compressed_size_mb": round(compressed_size / (1024 * 1024), 1),
+        }
+
+        # Raw custom-format archives (no stream compressor) are block-addressable:
+        # store a TOC index so single tables can be restored with range GETs.
+        if not compression.get("command") and not compression.get("python_gzip") \
+                and os.environ.get("TOC_INDEX", "1") == "1":
+            # Best effort: the backup itself is already uploaded
+            try:
+                with metrics.phase("index"):
+                    index = build_index(dump_path)
+                    index_key = f"{s3_key}.index.json"
+                    s3.put_object(Bucket=bucket, Key=index_key, Body=json.dumps(index).encode())
+                print(f"Uploaded TOC index ({len(index['entries'])} entries) to s3://{bucket}/{index_key}")
+                result["index_key"] = index_key
+            except Exception as e:
+                print(f"TOC index failed: {e}")
+                result["index_error"] = str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return result
+
+
+def backup_to_stream(db_url, bucket, prefix, timestamp, compression, metrics, schemas=None):
+    """Pipe pg_dump through the compressor straight into an S3 multipart upload.
+
+    Nothing is staged in /tmp. Parts upload concurrently while pg_dump is
+    still running, and the checksum and byte counts come from the same pass.
+    """
+    s3_key = f"{prefix}/vibrationfit_{timestamp}{compression['suffix']}"
+    part_size = int(os.environ.get("STREAM_PART_SIZE_MB", "16")) * 1024 * 1024
+    concurrency = int(os.environ.get("STREAM_UPLOAD_CONCURRENCY", "4"))
+
+    with PgDump(db_url, *dump_args(compression, schemas)) as dump:
+        with MultipartUploader(s3, bucket, s3_key, part_size=part_size,
+                               concurrency=concurrency) as upload:
+            with metrics.pipeline(dump.stdout, upload.write) as (source, write):
+                dump_size = compress_stream(source, write, compression)
+            dump.wait()
+            with metrics.phase("upload"):
+                uploaded = upload.complete()
 
-    dump_size = os.path.getsize(dump_path)
     print(f"Dump complete: {dump_size / (1024 * 1024):.1f} MB")
+    print(f"Compressed ({compression['name']}): {uploaded['bytes'] / (1024 * 1024):.1f} MB "
+          f"in {uploaded['parts']} parts")
+    print(f"Uploaded to s3://{bucket}/{s3_key} (sha256 {uploaded['sha256']})")
+
+    return {
+        "s3_key": s3_key,
+        "dump_size_mb": round(dump_size / (1024 * 1024), 1),
+        "compressed_size_mb": round(uploaded["bytes"] / (1024 * 1024), 1),
+        "dump_bytes": dump_size,
+        "compressed_bytes": uploaded["bytes"],
+        "sha256": uploaded["sha256"],
+    }
+
+
+def upload_dump_file(path, bucket, key):
+    """Upload one file of a directory-format dump and delete it locally."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    size = os.path.getsize(path)
+    s3.upload_file(path, bucket, key)
+    os.remove(path)
+    return {"name": os.path.basename(path), "key": key, "size": size, "sha256": sha256.hexdigest()}
+
+
+def backup_to_directory(db_url, bucket, prefix, timestamp, compression, metrics, schemas=None):
+    """Parallel directory-format dump with per-table uploads as files finish.
+
+    pg_dump -j exports one snapshot from the leader connection and every
+    worker imports it, so all tables are dumped from the same consistent
+    point in time. Each table file is uploaded (and removed from /tmp) as
+    soon as no pg_dump process holds it open; toc.dat is written last, then
+    a manifest listing every file's size and checksum marks the backup as
+    complete.
+    """
+    require_pg_dump_compression(compression, "directory")
 
-    with open(dump_path, "rb") as f_in:
-        with gzip.open(gz_path, "wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
+    jobs = int(os.environ.get("DUMP_JOBS", "4"))
+    concurrency = int(os.environ.get("DIRECTORY_UPLOAD_CONCURRENCY", "8"))
+    work_dir = tempfile.mkdtemp(prefix="vibrationfit_")
+    dump_dir = f"{work_dir}/vibrationfit_{timestamp}"
+    key_prefix = f"{prefix}/vibrationfit_{timestamp}"
 
-    gz_size = os.path.getsize(gz_path)
-    print(f"Compressed: {gz_size / (1024 * 1024):.1f} MB")
+    uploads = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            dump_start = time.monotonic()
+            with PgDump(db_url, "-F", "d", "-j", str(jobs), "-f", dump_dir,
+                        "--no-owner", "--no-acl", *compression["pg_dump_args"],
+                        *schema_args(schemas)) as dump:
+                while dump.proc.poll() is None:
+                    if os.path.isdir(dump_dir):
+                        names = [n for n in os.listdir(dump_dir) if n != "toc.dat" and n not in uploads]
+                        open_files = dump.open_files()
+                        for name in names:
+                            path = os.path.realpath(os.path.join(dump_dir, name))
+                            if path not in open_files:
+                                uploads[name] = pool.submit(
+                                    upload_dump_file, path, bucket, f"{key_prefix}/{name}"
+                                )
+                    time.sleep(0.5)
+                dump.wait()
+            dump_seconds = time.monotonic() - dump_start
 
-    s3_key = f"{prefix}/vibrationfit_{timestamp}.dump.gz"
-    s3.upload_file(gz_path, bucket, s3_key)
-    print(f"Uploaded to s3://{bucket}/{s3_key}")
+            # Whatever finished in the last polling interval, plus the TOC
+            for name in os.listdir(dump_dir):
+                if name not in uploads:
+                    uploads[name] = pool.submit(
+                        upload_dump_file, os.path.join(dump_dir, name), bucket, f"{key_prefix}/{name}"
+                    )
 
-    os.remove(dump_path)
-    os.remove(gz_path)
+            files = sorted((future.result() for future in uploads.values()), key=lambda f: f["name"])
+            # Uploads overlap the dump, so "upload" runs until the last file lands
+            upload_seconds = time.monotonic() - dump_start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(f["size"] for f in files)
+    metrics.add("dump", dump_seconds, total)
+    metrics.add("upload", upload_seconds, total)
+    manifest = {
+        "format": "directory",
+        "timestamp": timestamp,
+        "compression": compression["name"],
+        "jobs": jobs,
+        "total_bytes": total,
+        "files": files,
+    }
+    manifest_key = f"{key_prefix}/manifest.json"
+    s3.put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest, indent=2).encode())
+
+    print(f"Dump complete: {len(files)} files, {total / (1024 * 1024):.1f} MB ({jobs} jobs)")
+    print(f"Uploaded to s3://{bucket}/{key_prefix}/")
+
+    return {
+        "s3_key": manifest_key,
+        "dump_size_mb": round(total / (1024 * 1024), 1),
+        "compressed_size_mb": round(total / (1024 * 1024), 1),
+        "files": len(files),
+    }
+
+
+def backup_incremental_tables(db_url, bucket, prefix, timestamp, compression, metrics, schemas=None):
+    """Dump only the tables whose fingerprint changed since the last run."""
+    return backup_incremental(s3, db_url, bucket, prefix, timestamp, compression, metrics, schemas)
+
+
+def backup_deduplicated(db_url, bucket, prefix, timestamp, compression, metrics, schemas=None):
+    """Store an uncompressed dump as content-defined chunks, uploading only new ones.
+
+    Chunks are zlib-compressed individually, so pg_dump runs with -Z 0
+    regardless of BACKUP_COMPRESSION (compressed output wouldn't dedupe).
+    """
+    base = f"{prefix}/dedup"
+    concurrency = int(os.environ.get("DEDUP_UPLOAD_CONCURRENCY", "8"))
+
+    name = f"vibrationfit_{timestamp}"
+
+    with PgDump(db_url, "-F", "c", "--no-owner", "--no-acl", "-Z", "0", *schema_args(schemas)) as dump:
+        # Chunk uploads happen inside store_stream, so their backpressure is
+        # part of "compress"; "upload" only carries the stored bytes.
+        with metrics.pipeline(dump.stdout, None) as (source, _):
+            index = store_stream(s3, bucket, base, name, source, concurrency)
+        try:
+            dump.wait()
+        except Exception:
+            # Don't hold off garbage collection for a backup that won't be saved
+            release_marker(s3, bucket, base, name)
+            raise
+    index_key = save_index(s3, bucket, base, index)
+    metrics.add("upload", 0.0, index["stored_bytes"])
+
+    print(f"Dump complete: {index['total_bytes'] / (1024 * 1024):.1f} MB "
+          f"in {len(index['chunks'])} chunks")
+    print(f"New: {index['new_chunks']} chunks, {index['new_bytes'] / (1024 * 1024):.1f} MB "
+          f"({index['stored_bytes'] / (1024 * 1024):.1f} MB stored)")
+    print(f"Uploaded index to s3://{bucket}/{index_key}")
+
+    result = {
+        "s3_key": index_key,
+        "dump_size_mb": round(index["total_bytes"] / (1024 * 1024), 1),
+        "compressed_size_mb": round(index["stored_bytes"] / (1024 * 1024), 1),
+        "chunks": len(index["chunks"]),
+        "new_chunks": index["new_chunks"],
+    }
+
+    retention = os.environ.get("DEDUP_RETENTION")
+    if retention:
+        result["gc"] = collect_garbage(s3, bucket, base, parse_retention(retention))
+    return result
+
+
+def run_analytics_export(db_url, bucket, prefix, timestamp, tables, metrics):
+    """Parquet export of selected tables; best effort, the backup is already stored."""
+    try:
+        with metrics.phase("analytics") as phase:
+            analytics = export_analytics(s3, db_url, bucket, prefix, timestamp, tables)
+            phase["bytes"] = analytics["bytes"]
+        return analytics
+    except Exception as e:
+        print(f"Analytics export failed: {e}")
+        return {"error": str(e)}
+
+
+BACKUP_MODES = {
+    "file": backup_to_file,
+    "stream": backup_to_stream,
+    "directory": backup_to_directory,
+    "incremental": backup_incremental_tables,
+    "dedup": backup_deduplicated,
+}
+
+
+def run_backup(get_url, bucket, prefix, timestamp, mode, compression, analytics_tables,
+               schemas=None, target=None):
+    """Fetch the DB URL, back up in ``mode`` and run the optional analytics export."""
+    stream_compressed = mode == "dedup" or bool(compression.get("command") or compression.get("python_gzip"))
+    with BackupMetrics(mode, compression["name"], target, stream_compressed) as metrics:
+        try:
+            with metrics.phase("secret"):
+                db_url = get_url()
+
+            label = f" [{target}]" if target else ""
+            print(f"Starting database backup{label} at {timestamp} "
+                  f"(mode: {mode}, compression: {compression['name']})")
+            print(f"Target: s3://{bucket}/{prefix}/")
+
+            result = BACKUP_MODES[mode](db_url, bucket, prefix, timestamp, compression, metrics, schemas)
+
+            if analytics_tables:
+                result["analytics"] = run_analytics_export(
+                    db_url, bucket, prefix, timestamp, analytics_tables, metrics
+                )
+        except Exception:
+            metrics.emit(status="failed")
+            raise
 
     return {
         "status": "success",
         "timestamp": timestamp,
-        "s3_key": s3_key,
-        "dump_size_mb": round(dump_size / (1024 * 1024), 1),
-        "compressed_size_mb": round(gz_size / (1024 * 1024), 1),
+        "mode": mode,
+        "compression": compression["name"],
+        **result,
+        "metrics": metrics.emit(),
     }
+
+
+# ---------------------------------------------------------------------------
+# Multi-target fan-out
+# ---------------------------------------------------------------------------
+
+def load_targets(event):
+    """Targets from the payload or BACKUP_TARGETS (JSON list); None = the default database."""
+    targets = event.get("targets")
+    if targets is None and os.environ.get("BACKUP_TARGETS"):
+        targets = json.loads(os.environ["BACKUP_TARGETS"])
+    return targets
+
+
+def expand_jobs(targets, event):
+    """One job per target × schema (or one per target when it lists no schemas)."""
+    jobs = []
+    for target in targets:
+        mode = target.get("mode") or event.get("mode") or os.environ.get("BACKUP_MODE", "file")
+        if mode not in BACKUP_MODES:
+            raise ValueError(f"Unknown backup mode for target {target['name']}: {mode}")
+        compression = get_compression(target.get("compression") or event.get("compression"))
+        tables = parse_tables(target.get("analytics", ""))
+        schemas = target.get("schemas") or [None]
+        if schemas != [None]:
+            dropped = [table for table, _ in tables if table.split(".")[0] not in schemas]
+            if dropped:
+                print(f"Not exporting {', '.join(dropped)} for {target['name']}: "
+                      f"outside its schemas ({', '.join(schemas)})")
+        for schema in schemas:
+            jobs.append({
+                "id": f"{target['name']}/{schema}" if schema else target["name"],
+                "secret": target.get("secret") or DEFAULT_SECRET_ID,
+                "schemas": [schema] if schema else None,
+                "mode": mode,
+                "compression": compression,
+                # Each table is exported once, by the job that covers its schema
+                "analytics": [t for t in tables if schema is None or t[0].split(".")[0] == schema],
+            })
+    return jobs
+
+
+def pending_key(prefix):
+    return f"{prefix}/targets/pending.json"
+
+
+def load_pending(bucket, prefix):
+    """Job ids skipped or failed by the previous run, in the order they should go first."""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=pending_key(prefix))["Body"].read()
+    except s3.exceptions.NoSuchKey:
+        return []
+    pending = json.loads(body)
+    return pending["skipped"] + pending["failed"]
+
+
+def save_pending(bucket, prefix, timestamp, skipped, failed):
+    if not skipped and not failed:
+        s3.delete_object(Bucket=bucket, Key=pending_key(prefix))
+        return
+    body = {"timestamp": timestamp, "skipped": skipped, "failed": failed}
+    s3.put_object(Bucket=bucket, Key=pending_key(prefix), Body=json.dumps(body, indent=2).encode())
+    print(f"Recorded {len(skipped)} skipped and {len(failed)} failed targets "
+          f"in s3://{bucket}/{pending_key(prefix)}")
+
+
+def remaining_seconds(context):
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return float("inf")
+    return context.get_remaining_time_in_millis() / 1000
+
+
+def run_targets(targets, event, context, bucket, prefix, timestamp):
+    """Back up every target × schema with bounded concurrency inside the time budget.
+
+    A job only starts while the invocation has more time left than
+    BACKUP_TIME_RESERVE_SECONDS and than the slowest job so far took; the
+    rest are recorded as skipped and run first on the next invocation.
+    """
+    jobs = expand_jobs(targets, event)
+    pending = load_pending(bucket, prefix)
+    jobs.sort(key=lambda job: pending.index(job["id"]) if job["id"] in pending else len(pending))
+
+    concurrency = int(os.environ.get("BACKUP_CONCURRENCY", "2"))
+    reserve = float(os.environ.get("BACKUP_TIME_RESERVE_SECONDS", "60"))
+    cache = SecretCache()
+    results = {}
+    skipped = []
+    longest = 0.0
+
+    def run(job):
+        start = time.monotonic()
+        try:
+            result = run_backup(
+                lambda: cache.get(job["secret"]), bucket, f"{prefix}/{job['id']}", timestamp,
+                job["mode"], job["compression"], job["analytics"], job["schemas"], job["id"],
+            )
+        except Exception as e:
+            print(f"Backup of {job['id']} failed: {e}")
+            result = {"status": "failed", "error": str(e)}
+        return job["id"], result, time.monotonic() - start
+
+    def collect(futures):
+        nonlocal longest
+        for future in futures:
+            job_id, result, seconds = future.result()
+            results[job_id] = {**result, "seconds": round(seconds, 1)}
+            longest = max(longest, seconds)
+
+    print(f"Backing up {len(jobs)} targets (concurrency {concurrency})")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running = set()
+        for job in jobs:
+            if len(running) >= concurrency:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                collect(done)
+            if remaining_seconds(context) < max(reserve, longest):
+                print(f"Skipping {job['id']}: {remaining_seconds(context):.0f}s left in this invocation")
+                skipped.append(job["id"])
+                continue
+            running.add(pool.submit(run, job))
+        collect(running)
+
+    failed = [job_id for job_id, result in results.items() if result["status"] == "failed"]
+    save_pending(bucket, prefix, timestamp, skipped, failed)
+
+    succeeded = len(results) - len(failed)
+    if not failed and not skipped:
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "failed"
+    print(f"Targets: {succeeded} succeeded, {len(failed)} failed, {len(skipped)} skipped")
+
+    # Raise so the Lambda's Errors metric (and async retries) see a run that
+    # backed up nothing; partial failures show as Status=failed target metrics
+    if status == "failed":
+        raise Exception(f"No backup target succeeded ({len(failed)} failed, {len(skipped)} skipped): "
+                        + "; ".join(f"{job_id}: {results[job_id]['error']}" for job_id in failed))
+
+    return {
+        "status": status,
+        "timestamp": timestamp,
+        "targets": results,
+        "failed": failed,
+        "skipped": skipped,
+    }
+
+
+def handler(event, context):
+    bucket = os.environ["S3_BUCKET"]
+    prefix = os.environ.get("S3_PREFIX", "db-backups")
+    event = event or {}
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+
+    targets = load_targets(event)
+    if targets:
+        return run_targets(targets, event, context, bucket, prefix, timestamp)
+
+    mode = event.get("mode") or os.environ.get("BACKUP_MODE", "file")
+    compression = get_compression(event.get("compression"))
+    if mode not in BACKUP_MODES:
+        raise ValueError(f"Unknown backup mode: {mode}")
+
+    tables = parse_tables(event.get("analytics") or os.environ.get("ANALYTICS_TABLES", ""))
+    return run_backup(get_db_url, bucket, prefix, timestamp, mode, compression, tables)
@@ -0,0 +1,203 @@
+"""
+Per-phase backup metrics, emitted as CloudWatch Embedded Metric Format.
+
+Each phase (secret, dump, compress, upload, ...) records seconds and bytes.
+Where phases run as one pipeline (pg_dump | compressor | S3), ``dump`` and
+``upload`` are the time the pipeline spent blocked on reading pg_dump's
+output and on handing bytes to the uploader, and ``compress`` is the
+remainder of the pipeline's wall time — whichever is largest is the
+bottleneck. One EMF log line per invocation turns every value into a
+CloudWatch metric without any PutMetricData calls. Every dimension set
+includes Status, so failed runs don't skew the success series.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "VibrationFit/DbBackup")
+TMP_SAMPLE_INTERVAL = 0.5
+
+
+class BackupMetrics:
+    """Phase timings for one backup.
+
+    ``stream_compressed`` is True when bytes are compressed after pg_dump
+    (a stream compressor, or dedup's zlib chunks). Only then is dump bytes /
+    upload bytes a compression ratio; pg_dump's own compression happens
+    before the bytes are counted, so the ratio would always read 1.0.
+    """
+
+    def __init__(self, mode, compression, target=None, stream_compressed=False):
+        self.mode = mode
+        self.compression = compression
+        self.target = target
+        self.stream_compressed = stream_compressed
+        self.phases = {}
+        # Whole /tmp filesystem: shared with concurrent targets and whatever
+        # earlier invocations in this container left behind
+        self.container_peak_tmp_bytes = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def add(self, name, seconds=0.0, nbytes=0):
+        """Accumulate time and bytes into a phase (thread-safe)."""
+        with self._lock:
+            phase = self.phases.setdefault(name, {"seconds": 0.0, "bytes": 0})
+            phase["seconds"] += seconds
+            phase["bytes"] += nbytes
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block; set ``["bytes"]`` on the yielded dict to record volume."""
+        entry = {"bytes": 0}
+        start = time.monotonic()
+        try:
+            yield entry
+        finally:
+            self.add(name, time.monotonic() - start, entry["bytes"])
+
+    @contextmanager
+    def pipeline(self, source, write, write_phase="upload"):
+        """Wrap a pipeline's reader and writer to split its wall time.
+
+        Yields ``(source, write)`` replacements. Time blocked in
+        ``source.read`` goes to ``dump``, time in ``write`` to
+        ``write_phase`` and the rest of the block to ``compress``.
+        """
+        timed_source = _TimedReader(source)
+        timed_write = _TimedWriter(write) if write else None
+        start = time.monotonic()
+        try:
+            yield timed_source, timed_write
+        finally:
+            wall = time.monotonic() - start
+            write_seconds = timed_write.seconds if timed_write else 0.0
+            self.add("dump", timed_source.seconds, timed_source.bytes)
+            if timed_write:
+                self.add(write_phase, write_seconds, timed_write.bytes)
+            self.add("compress", max(wall - timed_source.seconds - write_seconds, 0.0),
+                     timed_source.bytes)
+
+    # -- /tmp usage ----------------------------------------------------------
+
+    def _sample_tmp(self):
+        while True:
+            used = shutil.disk_usage("/tmp").used
+            self.container_peak_tmp_bytes = max(self.container_peak_tmp_bytes, used)
+            if self._stop.wait(TMP_SAMPLE_INTERVAL):
+                return
+
+    def __enter__(self):
+        self._sampler = threading.Thread(target=self._sample_tmp, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._sampler.join()
+        return False
+
+    # -- Output --------------------------------------------------------------
+
+    def summary(self):
+        phases = {}
+        for name, phase in self.phases.items():
+            mb = phase["bytes"] / (1024 * 1024)
+            phases[name] = {
+                "seconds": round(phase["seconds"], 3),
+                "bytes": phase["bytes"],
+                "mb_per_s": round(mb / phase["seconds"], 1) if phase["seconds"] and mb else None,
+            }
+
+        dump_bytes = self.phases.get("dump", {}).get("bytes", 0)
+        stored_bytes = self.phases.get("upload", {}).get("bytes", 0)
+        ratio = None
+        if self.stream_compressed and stored_bytes:
+            ratio = round(dump_bytes / stored_bytes, 2)
+        return {
+            "total_seconds": round(time.monotonic() - self._start, 3),
+            "phases": phases,
+            "compression_ratio": ratio,
+            "container_peak_tmp_mb": round(self.container_peak_tmp_bytes / (1024 * 1024), 1),
+        }
+
+    def emit(self, status="success"):
+        """Print one EMF log line and return the summary."""
+        summary = self.summary()
+        metrics = [
+            {"Name": "TotalSeconds", "Unit": "Seconds"},
+            {"Name": "ContainerPeakTmpMB", "Unit": "Megabytes"},
+        ]
+        values = {
+            "TotalSeconds": summary["total_seconds"],
+            "ContainerPeakTmpMB": summary["container_peak_tmp_mb"],
+        }
+        if summary["compression_ratio"] is not None:
+            metrics.append({"Name": "CompressionRatio", "Unit": "None"})
+            values["CompressionRatio"] = summary["compression_ratio"]
+
+        for name, phase in summary["phases"].items():
+            label = name.capitalize()
+            metrics.append({"Name": f"{label}Seconds", "Unit": "Seconds"})
+            metrics.append({"Name": f"{label}Bytes", "Unit": "Bytes"})
+            values[f"{label}Seconds"] = phase["seconds"]
+            values[f"{label}Bytes"] = phase["bytes"]
+            if phase["mb_per_s"] is not None:
+                metrics.append({"Name": f"{label}Throughput", "Unit": "Megabytes/Second"})
+                values[f"{label}Throughput"] = phase["mb_per_s"]
+
+        dimensions = [["Mode", "Status"], ["Mode", "Compression", "Status"]]
+        target = {}
+        if self.target:
+            dimensions.append(["Target", "Status"])
+            target = {"Target": self.target}
+
+        print(json.dumps({
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": dimensions,
+                    "Metrics": metrics,
+                }],
+            },
+            "Mode": self.mode,
+            "Compression": self.compression,
+            **target,
+            "Status": status,
+            **values,
+        }))
+        return summary
+
+
+class _TimedReader:
+    def __init__(self, source):
+        self.source = source
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def read(self, size=-1):
+        start = time.monotonic()
+        data = self.source.read(size)
+        self.seconds += time.monotonic() - start
+        self.bytes += len(data)
+        return data
+
+
+class _TimedWriter:
+    def __init__(self, write):
+        self.write = write
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __call__(self, data):
+        start = time.monotonic()
+        self.write(data)
+        self.seconds += time.monotonic() - start
+        self.bytes += len(data)
@@ -0,0 +1,133 @@
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class MultipartUploader:
+    """Streams bytes into an S3 multipart upload.
+
+    Incoming data is packed into part-sized buffers drawn from a fixed pool.
+    Full buffers are uploaded by a thread pool and returned to the pool when
+    their part completes, so memory stays at ``max_buffers * part_size`` and
+    ``write()`` blocks (backpressure) while every buffer is in flight.
+    A SHA-256 of the uploaded bytes is computed in the same pass. The first
+    failed part is re-raised by the next ``write()``, so the producer stops
+    instead of streaming into an upload that can no longer complete.
+    """
+
+    def __init__(self, client, bucket, key, part_size=16 * 1024 * 1024,
+                 concurrency=4, max_buffers=None):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+        self.sha256 = hashlib.sha256()
+
+        self._pool = queue.Queue()
+        for _ in range(max_buffers or concurrency + 1):
+            self._pool.put(bytearray())
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._futures = []
+        self._parts = []
+        self._parts_lock = threading.Lock()
+        self._buffer = None
+        self._next_part = 1
+        self._upload_id = None
+        self._error = None
+
+    def __enter__(self):
+        response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key)
+        self._upload_id = response["UploadId"]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    def write(self, data):
+        self._raise_failed_part()
+        view = memoryview(data)
+        self.sha256.update(view)
+        self.bytes_written += len(view)
+
+        while len(view):
+            if self._buffer is None:
+                self._buffer = self._pool.get()
+                self._raise_failed_part()
+            room = self.part_size - len(self._buffer)
+            self._buffer += view[:room]
+            view = view[room:]
+            if len(self._buffer) >= self.part_size:
+                self._submit()
+
+    def _submit(self):
+        buffer, self._buffer = self._buffer, None
+        part_number = self._next_part
+        self._next_part += 1
+        self._futures.append(self._executor.submit(self._upload_part, part_number, buffer))
+
+    def _upload_part(self, part_number, buffer):
+        try:
+            response = self.client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=bytes(buffer),
+            )
+            with self._parts_lock:
+                self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+            raise
+        finally:
+            buffer.clear()
+            self._pool.put(buffer)
+
+    def _raise_failed_part(self):
+        if self._error is not None:
+            raise self._error
+
+    def complete(self):
+        """Flush the last part, wait for all parts and finish the upload."""
+        if (self._buffer is not None and len(self._buffer)) or self._next_part == 1:
+            if self._buffer is None:
+                self._buffer = self._pool.get()
+            self._submit()
+
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+        parts = sorted(self._parts, key=lambda p: p["PartNumber"])
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+        return {
+            "bytes": self.bytes_written,
+            "parts": len(parts),
+            "sha256": self.sha256.hexdigest(),
+        }
+
+    def abort(self):
+        for future in self._futures:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        if self._upload_id:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id
+            )
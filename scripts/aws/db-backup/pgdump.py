@@ -0,0 +1,92 @@
+import os
+import subprocess
+import threading
+
+DUMP_TIMEOUT = int(os.environ.get("DUMP_TIMEOUT", "240"))
+
+
+class PgDump:
+    """Runs pg_dump with stdout piped, stderr drained and a hard timeout.
+
+    Use as a context manager; read the dump from ``stdout`` (unless ``-f``
+    was passed) and call ``wait()`` once it is exhausted. The process is
+    killed on exit if it is still running.
+    """
+
+    def __init__(self, db_url, *args, timeout=DUMP_TIMEOUT):
+        self.command = ["pg_dump", db_url, *args]
+        self.timeout = timeout
+        self.timed_out = False
+        self._stderr = []
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            self.command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.stdout = self.proc.stdout
+        self._stderr_thread = threading.Thread(
+            target=lambda: self._stderr.append(self.proc.stderr.read())
+        )
+        self._stderr_thread.start()
+        self._watchdog = threading.Timer(self.timeout, self._kill)
+        self._watchdog.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._watchdog.cancel()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self._stderr_thread.join()
+        return False
+
+    def _kill(self):
+        self.timed_out = True
+        self.proc.kill()
+
+    def pids(self):
+        """pg_dump and its worker processes (``-j``), via /proc on Linux."""
+        pids = [self.proc.pid]
+        try:
+            entries = os.listdir("/proc")
+        except OSError:
+            return pids
+        for entry in entries:
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # Fields after the ")" closing the command name: state, ppid, ...
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == self.proc.pid:
+                pids.append(int(entry))
+        return pids
+
+    def open_files(self):
+        """Paths currently held open by pg_dump or any of its workers."""
+        paths = set()
+        for pid in self.pids():
+            fd_dir = f"/proc/{pid}/fd"
+            try:
+                fds = os.listdir(fd_dir)
+            except OSError:
+                continue
+            for fd in fds:
+                try:
+                    paths.add(os.readlink(f"{fd_dir}/{fd}"))
+                except OSError:
+                    continue
+        return paths
+
+    def wait(self):
+        returncode = self.proc.wait()
+        self._stderr_thread.join()
+        if returncode != 0:
+            print(f"pg_dump stderr: {b''.join(self._stderr).decode(errors='replace')}")
+            if self.timed_out:
+                raise Exception(f"pg_dump timed out after {self.timeout}s")
+            raise Exception(f"pg_dump failed with exit code {returncode}")
@@ -0,0 +1,55 @@
+import subprocess
+import uuid
+
+
+class PsqlSession:
+    """A long-lived psql process for running queries inside one transaction.
+
+    Keeping the session open lets us export its snapshot (``pg_export_snapshot``)
+    and hand it to pg_dump ``--snapshot`` so that queries here and every dump
+    see the same point in time. Results are returned as unaligned text.
+    """
+
+    def __init__(self, db_url):
+        self.db_url = db_url
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            ["psql", self.db_url, "-X", "-q", "-A", "-t", "-v", "ON_ERROR_STOP=1"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.write("COMMIT;\n\\q\n")
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        return False
+
+    def query(self, sql):
+        """Run ``sql`` and return its output (one line per row)."""
+        sentinel = f"__done_{uuid.uuid4().hex}__"
+        self.proc.stdin.write(f"{sql.rstrip().rstrip(';')};\n\\echo {sentinel}\n")
+        self.proc.stdin.flush()
+
+        lines = []
+        for line in self.proc.stdout:
+            line = line.rstrip("\n")
+            if line == sentinel:
+                return "\n".join(lines)
+            lines.append(line)
+        raise Exception(f"psql exited with code {self.proc.wait()} while running query")
+
+    def export_snapshot(self):
+        """Start a repeatable-read transaction and export its snapshot id."""
+        self.query("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+        return self.query("SELECT pg_export_snapshot()").strip()
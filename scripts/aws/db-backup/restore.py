@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Restore VibrationFit database backups from S3.
+
+Usage:
+    # Directory-format backup (BACKUP_MODE=directory), restored with pg_restore -j:
+    python3 restore.py directory s3://BUCKET/db-backups/vibrationfit_YYYYMMDD_HHMMSS/ \\
+        --db-url "postgresql://..." --jobs 8
+
+    # Download and verify only (no pg_restore):
+    python3 restore.py directory s3://BUCKET/db-backups/vibrationfit_YYYYMMDD_HHMMSS/ --download-only
+
+    # Incremental backups (BACKUP_MODE=incremental), latest or as of a point in time:
+    python3 restore.py incremental s3://BUCKET/db-backups/ --db-url "postgresql://..." \\
+        [--at YYYYMMDD_HHMMSS]
+
+    # Deduplicated backups (BACKUP_MODE=dedup), streamed straight into pg_restore:
+    python3 restore.py dedup s3://BUCKET/db-backups/ --db-url "postgresql://..." \\
+        [--at YYYYMMDD_HHMMSS] [--output vibrationfit.dump]
+
+    # One table (or schema) from a raw .dump, fetching only its byte ranges:
+    python3 restore.py table s3://BUCKET/db-backups/vibrationfit_YYYYMMDD_HHMMSS.dump \\
+        --table public.user_profiles --db-url "postgresql://..." [--data-only]
+
+Set S3_ENDPOINT_URL to restore from a local S3 stand-in.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from chunkstore import load_index, restore_stream
+from tocindex import patch_offsets, select_entries
+
+s3 = boto3.client("s3", endpoint_url=os.environ.get("S3_ENDPOINT_URL"))
+
+
+def parse_s3_url(url: str) -> tuple:
+    """Split s3://bucket/key into (bucket, key)."""
+    if not url.startswith("s3://"):
+        print(f"ERROR: Expected an s3:// URL, got: {url}")
+        sys.exit(1)
+    bucket, _, key = url[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def load_json(bucket: str, key: str) -> dict:
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(response["Body"].read())
+
+
+def file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def run_pg_restore(db_url: str, *args: str) -> None:
+    cmd = ["pg_restore", "-d", db_url, "--no-owner", "--no-acl", *args]
+    print(f"  Running: pg_restore {' '.join(args)}")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"  ERROR: pg_restore failed:\n{result.stderr[-2000:]}")
+        sys.exit(1)
+
+
+def existing_schemas(db_url: str) -> list:
+    """Schemas already present in the target database."""
+    result = subprocess.run(
+        ["psql", db_url, "-X", "-A", "-t", "-c", "SELECT nspname FROM pg_namespace"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(f"  ERROR: Could not list schemas:\n{result.stderr[-2000:]}")
+        sys.exit(1)
+    return result.stdout.split()
+
+
+# ---------------------------------------------------------------------------
+# Directory format
+# ---------------------------------------------------------------------------
+
+def download_directory(bucket: str, key_prefix: str, target_dir: str, concurrency: int) -> dict:
+    """Download every file in a directory-format backup and verify checksums."""
+    manifest = load_json(bucket, f"{key_prefix}/manifest.json")
+    os.makedirs(target_dir, exist_ok=True)
+
+    def fetch(entry):
+        path = os.path.join(target_dir, entry["name"])
+        if not (os.path.exists(path) and file_sha256(path) == entry["sha256"]):
+            s3.download_file(bucket, entry["key"], path)
+            if file_sha256(path) != entry["sha256"]:
+                raise Exception(f"Checksum mismatch for {entry['name']}")
+        return entry["size"]
+
+    print(f"  Downloading {len(manifest['files'])} files "
+          f"({manifest['total_bytes'] / (1024 * 1024):.1f} MB)...")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fetch, manifest["files"]))
+    print(f"  Verified all checksums in {target_dir}")
+    return manifest
+
+
+def restore_directory(args) -> None:
+    bucket, key_prefix = parse_s3_url(args.source)
+    key_prefix = key_prefix.rstrip("/")
+    if key_prefix.endswith("/manifest.json"):
+        key_prefix = key_prefix[: -len("/manifest.json")]
+
+    target_dir = args.target_dir or os.path.basename(key_prefix)
+    download_directory(bucket, key_prefix, target_dir, args.concurrency)
+
+    if args.download_only:
+        print(f"  Restore later with: pg_restore -j {args.jobs} -d \"$DB_URL\" {target_dir}")
+        return
+
+    run_pg_restore(args.db_url, "-j", str(args.jobs), target_dir)
+    print("  Restore complete.")
+
+
+# ---------------------------------------------------------------------------
+# Incremental
+# ---------------------------------------------------------------------------
+
+def resolve_incremental_manifest(bucket: str, key: str, at: str = None) -> dict:
+    """Walk the manifest chain back from the newest run to the one in effect at ``at``."""
+    if key.endswith(".json"):
+        return load_json(bucket, key)
+
+    base = f"{key.rstrip('/')}/incremental"
+    try:
+        manifest = load_json(bucket, f"{base}/latest.json")
+    except s3.exceptions.NoSuchKey:
+        print(f"  ERROR: No incremental backups found under s3://{bucket}/{base}/")
+        sys.exit(1)
+
+    while at and manifest["timestamp"] > at:
+        if not manifest["previous"]:
+            print(f"  ERROR: No incremental backup at or before {at}")
+            sys.exit(1)
+        manifest = load_json(bucket, manifest["previous"])
+    return manifest
+
+
+def restore_incremental(args) -> None:
+    bucket, key = parse_s3_url(args.source)
+    manifest = resolve_incremental_manifest(bucket, key, args.at)
+    tables = manifest["tables"]
+
+    target_dir = args.target_dir or f"incremental_{manifest['timestamp']}"
+    os.makedirs(os.path.join(target_dir, "data"), exist_ok=True)
+
+    reused = sum(1 for entry in tables.values() if entry["backup_timestamp"] != manifest["timestamp"])
+    print(f"  Backup {manifest['timestamp']}: {len(tables)} tables "
+          f"({reused} carried over from earlier runs)")
+
+    downloads = [(manifest["schema"], os.path.join(target_dir, "schema.dump"))]
+    for table, entry in tables.items():
+        downloads.append((entry, os.path.join(target_dir, "data", f"{table}.dump")))
+
+    def fetch(item):
+        entry, path = item
+        if not (os.path.exists(path) and file_sha256(path) == entry["sha256"]):
+            s3.download_file(bucket, entry["key"], path)
+            if file_sha256(path) != entry["sha256"]:
+                raise Exception(f"Checksum mismatch for {entry['key']}")
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(fetch, downloads))
+    print(f"  Verified {len(downloads)} archives in {target_dir}")
+
+    if args.download_only:
+        return
+
+    schema_path = os.path.join(target_dir, "schema.dump")
+    # The archive is dumped with "-n <schema>", so it creates (and comments on)
+    # each backed-up schema; skip those the target already has (e.g. public)
+    existing = set(existing_schemas(args.db_url)) & set(manifest.get("schemas", ["public"]))
+    skip = [f" SCHEMA - {schema} " for schema in existing] + [f" COMMENT - SCHEMA {schema} " for schema in existing]
+    toc = subprocess.run(["pg_restore", "-l", schema_path], capture_output=True, text=True, check=True)
+    list_path = os.path.join(target_dir, "schema.list")
+    with open(list_path, "w") as f:
+        f.writelines(
+            line + "\n" for line in toc.stdout.splitlines()
+            if not any(entry in line for entry in skip)
+        )
+    run_pg_restore(args.db_url, "--section=pre-data", "-L", list_path, schema_path)
+    # Constraints are post-data, so tables can load in any order
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        list(pool.map(
+            lambda path: run_pg_restore(args.db_url, "--data-only", path),
+            [path for _, path in downloads[1:]],
+        ))
+    run_pg_restore(args.db_url, "--section=post-data", schema_path)
+    print("  Restore complete.")
+
+
+# ---------------------------------------------------------------------------
+# Deduplicated
+# ---------------------------------------------------------------------------
+
+def restore_dedup(args) -> None:
+    bucket, key = parse_s3_url(args.source)
+    base = f"{key.rstrip('/')}/dedup"
+
+    paginator = s3.get_paginator("list_objects_v2")
+    index_keys = sorted(
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{base}/indexes/")
+        for obj in page.get("Contents", [])
+    )
+    if args.at:
+        index_keys = [k for k in index_keys if k[: -len(".json")][-len("YYYYMMDD_HHMMSS"):] <= args.at]
+    if not index_keys:
+        print(f"  ERROR: No deduplicated backups found under s3://{bucket}/{base}/")
+        sys.exit(1)
+
+    index = load_index(s3, bucket, index_keys[-1])
+    print(f"  Backup {index['name']}: {len(index['chunks'])} chunks "
+          f"({index['total_bytes'] / (1024 * 1024):.1f} MB)")
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            restore_stream(s3, bucket, base, index, f.write, args.concurrency)
+        print(f"  Wrote {args.output}")
+        return
+
+    # Custom-format archives can be restored from stdin (serially)
+    proc = subprocess.Popen(
+        ["pg_restore", "-d", args.db_url, "--no-owner", "--no-acl"],
+        stdin=subprocess.PIPE,
+    )
+    try:
+        restore_stream(s3, bucket, base, index, proc.stdin.write, args.concurrency)
+    finally:
+        proc.stdin.close()
+    if proc.wait() != 0:
+        print(f"  ERROR: pg_restore failed with exit code {proc.returncode}")
+        sys.exit(1)
+    print("  Restore complete.")
+
+
+# ---------------------------------------------------------------------------
+# Single table / schema via range GETs
+# ---------------------------------------------------------------------------
+
+def fetch_ranges(bucket: str, key: str, ranges: list, path: str, concurrency: int) -> int:
+    """Write each (start, end) byte range of an S3 object at the same offset in ``path``."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    def fetch(span):
+        start, end = span
+        body = s3.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end - 1}")["Body"].read()
+        with open(path, "r+b") as f:
+            f.seek(start)
+            f.write(body)
+        return len(body)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(fetch, merged))
+
+
+def restore_table(args) -> None:
+    bucket, key = parse_s3_url(args.source)
+    try:
+        index = load_json(bucket, f"{key}.index.json")
+    except s3.exceptions.NoSuchKey:
+        print(f"  ERROR: No TOC index for s3://{bucket}/{key} "
+              "(only raw .dump backups from the file mode are indexed)")
+        sys.exit(1)
+
+    if args.table:
+        schema, _, table = args.table.rpartition(".")
+        schema = schema or "public"
+    else:
+        schema, table = args.schema, None
+    entries = select_entries(index, schema, table)
+    if not entries:
+        print(f"  ERROR: No table data for {args.table or args.schema} in this backup")
+        sys.exit(1)
+
+    # A sparse file the size of the archive: only the header/TOC and the
+    # selected data blocks are real; pg_restore seeks straight to them.
+    path = args.output or f"{os.path.basename(key)}.partial"
+    with open(path, "wb") as f:
+        f.truncate(index["archive_size"])
+    ranges = [(0, index["toc_end"])] + [(e["data_start"], e["data_end"]) for e in entries]
+    fetched = fetch_ranges(bucket, key, ranges, path, args.concurrency)
+    with open(path, "r+b") as f:
+        patch_offsets(f, index, entries)
+    print(f"  Fetched {fetched / (1024 * 1024):.2f} MB of "
+          f"{index['archive_size'] / (1024 * 1024):.1f} MB ({len(entries)} data blocks)")
+
+    restore_args = ["-n", schema]
+    if table:
+        restore_args += ["-t", table]
+    if args.data_only:
+        restore_args.append("--data-only")
+    if args.clean:
+        restore_args += ["--clean", "--if-exists"]
+
+    if not args.db_url:
+        print(f"  Restore later with: pg_restore -d \"$DB_URL\" {' '.join(restore_args)} {path}")
+        return
+
+    run_pg_restore(args.db_url, *restore_args, path)
+    if not args.output:
+        os.remove(path)
+    print("  Restore complete.")
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore VibrationFit database backups from S3")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    directory = subparsers.add_parser("directory", help="Restore a directory-format backup")
+    directory.add_argument("source", help="s3://bucket/prefix/vibrationfit_<timestamp>/")
+    directory.add_argument("--db-url", help="Target database connection string")
+    directory.add_argument("--target-dir", help="Local download directory")
+    directory.add_argument("--jobs", "-j", type=int, default=4, help="pg_restore parallel jobs")
+    directory.add_argument("--concurrency", type=int, default=8, help="Parallel downloads")
+    directory.add_argument("--download-only", action="store_true", help="Skip pg_restore")
+    directory.set_defaults(func=restore_directory)
+
+    incremental = subparsers.add_parser(
+        "incremental", help="Assemble and restore a full set from incremental manifests"
+    )
+    incremental.add_argument(
+        "source", help="s3://bucket/prefix/ (uses the manifest chain) or a manifest .json URL"
+    )
+    incremental.add_argument("--at", help="Restore the newest backup at or before YYYYMMDD_HHMMSS")
+    incremental.add_argument("--db-url", help="Target database connection string")
+    incremental.add_argument("--target-dir", help="Local download directory")
+    incremental.add_argument("--jobs", "-j", type=int, default=4, help="Tables restored in parallel")
+    incremental.add_argument("--concurrency", type=int, default=8, help="Parallel downloads")
+    incremental.add_argument("--download-only", action="store_true", help="Skip pg_restore")
+    incremental.set_defaults(func=restore_incremental)
+
+    dedup = subparsers.add_parser("dedup", help="Restore a deduplicated (chunked) backup")
+    dedup.add_argument("source", help="s3://bucket/prefix/ (the Lambda's S3_PREFIX)")
+    dedup.add_argument("--at", help="Restore the newest backup at or before YYYYMMDD_HHMMSS")
+    dedup.add_argument("--db-url", help="Target database connection string")
+    dedup.add_argument("--output", help="Write the reassembled .dump here instead of restoring")
+    dedup.add_argument("--concurrency", type=int, default=8, help="Parallel chunk downloads")
+    dedup.set_defaults(func=restore_dedup, download_only=False)
+
+    table = subparsers.add_parser(
+        "table", help="Restore one table or schema from a .dump using its TOC index"
+    )
+    table.add_argument("source", help="s3://bucket/prefix/vibrationfit_<timestamp>.dump")
+    target = table.add_mutually_exclusive_group(required=True)
+    target.add_argument("--table", help="schema.table to restore (schema defaults to public)")
+    target.add_argument("--schema", help="Restore every table in this schema")
+    table.add_argument("--db-url", help="Target database (omit to only fetch the partial archive)")
+    table.add_argument("--output", help="Keep the partial archive at this path")
+    table.add_argument("--data-only", action="store_true", help="Restore rows only (table must exist)")
+    table.add_argument("--clean", action="store_true", help="Drop and recreate the table first")
+    table.add_argument("--concurrency", type=int, default=8, help="Parallel range GETs")
+    table.set_defaults(func=restore_table)
+
+    args = parser.parse_args()
+    db_url_optional = (
+        args.command == "table"
+        or getattr(args, "download_only", False)
+        or getattr(args, "output", None)
+    )
+    if not db_url_optional and not args.db_url:
+        parser.error("--db-url is required unless --download-only or --output is set")
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Stream compression through an external compressor.
+
+    pip install pytest
+    python -m pytest scripts/aws/db-backup/test_compression.py
+"""
+
+import gzip
+import io
+import os
+import threading
+
+import pytest
+
+from compression import _compress_external, compress_stream, get_compression
+
+
+def run_with_timeout(target, seconds=30):
+    """Run ``target`` in a thread; fail instead of hanging the suite."""
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "compression hung"
+    return outcome
+
+
+def test_external_compressor_round_trips():
+    data = os.urandom(3 * 1024 * 1024) + b"row\n" * 500_000
+    out = io.BytesIO()
+
+    total = compress_stream(io.BytesIO(data), out.write, {"command": ["gzip", "-c"]})
+
+    assert total == len(data)
+    assert gzip.decompress(out.getvalue()) == data
+
+
+def test_failing_writer_stops_the_compressor():
+    calls = []
+
+    def write(chunk):
+        calls.append(len(chunk))
+        if len(calls) == 2:
+            raise OSError("upload failed")
+
+    # Far more than the pipe buffers hold, so the compressor would block
+    outcome = run_with_timeout(lambda: _compress_external(io.BytesIO(b"x" * (50 * 1024 * 1024)), write, ["cat"]))
+
+    assert isinstance(outcome.get("error"), OSError)
+    assert str(outcome["error"]) == "upload failed"
+
+
+def test_python_gzip_has_no_process():
+    out = io.BytesIO()
+    assert compress_stream(io.BytesIO(b"abc" * 1000), out.write, get_compression("gzip")) == 3000
+    assert gzip.decompress(out.getvalue()) == b"abc" * 1000
+
+
+@pytest.mark.parametrize("name", ["native", "none"])
+def test_pg_dump_compression_passes_bytes_through(name):
+    out = io.BytesIO()
+    assert compress_stream(io.BytesIO(b"data"), out.write, get_compression(name)) == 4
+    assert out.getvalue() == b"data"
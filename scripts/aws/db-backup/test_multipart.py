@@ -0,0 +1,94 @@
+"""
+MultipartUploader against moto's in-process S3.
+
+    pip install pytest moto boto3
+    python -m pytest scripts/aws/db-backup/test_multipart.py
+"""
+
+import hashlib
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from multipart import MIN_PART_SIZE, MultipartUploader
+
+BUCKET = "vibrationfit-backups-test"
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+class FailingClient:
+    """Delegates to ``client`` but fails upload_part for one part number."""
+
+    def __init__(self, client, fail_part):
+        self.client = client
+        self.fail_part = fail_part
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] == self.fail_part:
+            raise RuntimeError(f"part {self.fail_part} failed")
+        return self.client.upload_part(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def upload(client, key, chunks, **kwargs):
+    with MultipartUploader(client, BUCKET, key, part_size=MIN_PART_SIZE, **kwargs) as uploader:
+        for chunk in chunks:
+            uploader.write(chunk)
+        return uploader.complete()
+
+
+def test_parts_are_assembled_in_order(s3):
+    data = os.urandom(3 * MIN_PART_SIZE + 12345)
+    # Odd chunk sizes so writes straddle part boundaries
+    chunks = [data[i:i + 999_983] for i in range(0, len(data), 999_983)]
+
+    result = upload(s3, "db.dump", chunks, concurrency=4)
+
+    body = s3.get_object(Bucket=BUCKET, Key="db.dump")["Body"].read()
+    assert body == data
+    assert result["bytes"] == len(data)
+    assert result["parts"] == 4
+    assert result["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+def test_empty_upload_creates_empty_object(s3):
+    result = upload(s3, "empty.dump", [])
+
+    assert s3.get_object(Bucket=BUCKET, Key="empty.dump")["Body"].read() == b""
+    assert result == {"bytes": 0, "parts": 1, "sha256": hashlib.sha256(b"").hexdigest()}
+
+
+def test_failed_part_aborts_the_upload(s3):
+    client = FailingClient(s3, fail_part=2)
+    chunk = b"x" * (1024 * 1024)
+
+    with pytest.raises(RuntimeError, match="part 2 failed"):
+        upload(client, "broken.dump", [chunk] * (6 * MIN_PART_SIZE // len(chunk)), concurrency=2)
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+
+
+def test_write_raises_as_soon_as_a_part_fails(s3):
+    client = FailingClient(s3, fail_part=1)
+    chunk = b"x" * (1024 * 1024)
+    total = 100 * MIN_PART_SIZE
+
+    with MultipartUploader(client, BUCKET, "stopped.dump", part_size=MIN_PART_SIZE,
+                           concurrency=1, max_buffers=2) as uploader:
+        with pytest.raises(RuntimeError, match="part 1 failed"):
+            while uploader.bytes_written < total:
+                uploader.write(chunk)
+        # The producer was stopped after a few parts, not at complete()
+        assert uploader.bytes_written <= 4 * MIN_PART_SIZE
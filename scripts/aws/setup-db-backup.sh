@@ -148,9 +148,15 @@ TRUSTEOF
   "Statement": [
     {
       "Effect": "Allow",
-      "Action": ["s3:PutObject"],
+      "Action": ["s3:PutObject", "s3:GetObject", "s3:DeleteObject", "s3:AbortMultipartUpload"],
       "Resource": "arn:aws:s3:::${S3_BUCKET}/${S3_PREFIX}/*"
     },
+    {
+      "Effect": "Allow",
+      "Action": ["s3:ListBucket"],
+      "Resource": "arn:aws:s3:::${S3_BUCKET}",
+      "Condition": { "StringLike": { "s3:prefix": ["${S3_PREFIX}/*"] } }
+    },
     {
       "Effect": "Allow",
       "Action": ["secretsmanager:GetSecretValue"],
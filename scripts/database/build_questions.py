@@ -1,13 +1,73 @@
 #!/usr/bin/env python3
 """
 Build comprehensive conditional questions system for VibrationFit Assessment
+
+The question catalog lives in data files, one per category:
+
+    scripts/database/questions/<category>.json
+
+This script validates the catalog and generates:
+
+    <out-dir>/questions.ts     TypeScript module (assessmentQuestions)
+    <out-dir>/questions.json   The same catalog as JSON, for server-side loading
+    <out-dir>/categories/<category>.ts   One lazily loaded module per category
+    <out-dir>/runtime.ts       Types and condition helpers shared by the chunks
+    <out-dir>/manifest.ts      Chunk loaders and content hashes (manifest.json for tooling)
+    <out-dir>/scoring.json     Numeric scoring matrix for rescore_assessments.py
+
+Conditional logic is data, not code: a condition is a descriptor such as
+{"field": "has_children", "when": {"op": "eq", "value": true}}, and both
+outputs carry a field -> question ids dependency index, so a profile change
+only re-evaluates the questions that depend on that field.
+
+Usage:
+    python3 scripts/database/build_questions.py [--catalog DIR] [--out-dir DIR] [--force]
 """
 
-def create_questions_file():
-    """Create the complete questions.ts file with conditional logic"""
-    
-    # Start building the TypeScript file content
-    ts_content = '''export interface QuestionOption {
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+from collections import Counter
+from io import StringIO
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CATALOG_DIR = SCRIPT_DIR / 'questions'
+OUT_DIR = SCRIPT_DIR / 'generated'
+
+# Same order as AssessmentCategory in src/types/assessment.ts
+CATEGORIES = [
+    'money', 'health', 'family', 'love', 'social', 'work',
+    'fun', 'travel', 'home', 'stuff', 'giving', 'spirituality',
+]
+GREEN_LINES = ('above', 'neutral', 'below')
+MIN_VALUE, MAX_VALUE = 0, 5
+# Same cut-offs as getGreenLineStatus in src/lib/assessment/scoring.ts (percent of max score)
+GREEN_LINE_THRESHOLDS = {'above': 80, 'transition': 60}
+ID_PATTERN = re.compile(r'^[a-z][a-z0-9_]*$')
+WRITE_BUFFER = 1 << 16
+
+# Condition operator -> required keys; semantics follow JavaScript (truthiness, ===)
+CONDITION_OPS = {
+    'truthy': (),
+    'falsy': (),
+    'eq': ('value',),
+    'neq': ('value',),
+    'in': ('values',),
+    'not_in': ('values',),
+}
+# Stands in for "any other value" of a non-boolean field when enumerating branches
+OTHER_VALUE = '__other__'
+# Legacy '(value) => ...' lambdas that compile_condition() understands
+LAMBDA_PATTERN = re.compile(r'^\(?\s*([A-Za-z_$][\w$]*)\s*\)?\s*=>\s*(.+?)\s*;?$')
+LITERAL_PATTERN = re.compile(r'''^(true|false|null|-?\d+(?:\.\d+)?|'[^'\\]*'|"[^"\\]*")$''')
+
+TS_TYPES = '''export interface QuestionOption {
   text: string
   value: number
   emoji: string
@@ -15,8 +75,16 @@ def create_questions_file():
   isCustom?: boolean
 }
 
+export type ConditionValue = string | number | boolean | null
+
+export type ConditionDescriptor =
+  | { op: 'truthy' | 'falsy' }
+  | { op: 'eq' | 'neq'; value: ConditionValue }
+  | { op: 'in' | 'not_in'; values: ConditionValue[] }
+
 export interface ConditionalLogic {
   field: string
+  when: ConditionDescriptor
   condition: (value: any) => boolean
 }
 
@@ -28,401 +96,797 @@ export interface AssessmentQuestion {
   conditionalLogic?: ConditionalLogic
 }
 
-export const assessmentQuestions: AssessmentQuestion[] = [
 '''
 
-    # Define all questions with conditional logic
-    questions = []
-    
-    # MONEY/WEALTH QUESTIONS (7 questions - no conditionals)
-    money_questions = [
-        {
-            'id': 'money_1',
-            'category': 'money',
-            'text': 'You open your banking app. What happens in your body?',
-            'options': [
-                {'text': 'I feel calm, curious to see the balance', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Neutral, just checking numbers', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I hesitate for a second before opening it', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'My stomach tightens', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I avoid it entirely unless I absolutely have to', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_2',
-            'category': 'money',
-            'text': 'Someone asks "How much do you make?" What\'s your honest reaction?',
-            'options': [
-                {'text': 'I share openly, no shame', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I\'m comfortable sharing with close people', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I deflect or give a vague answer', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I feel uncomfortable or defensive', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I lie or exaggerate', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_3',
-            'category': 'money',
-            'text': 'You see someone driving a car you\'d love to own. What thought comes first?',
-            'options': [
-                {'text': '"That\'s coming for me too"', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': '"Good for them, that\'s awesome"', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': '"Nice car" (no emotional charge)', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': '"Must be nice..." (with a twinge of resentment)', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': '"They probably inherited it / got lucky / married rich"', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_4',
-            'category': 'money',
-            'text': 'You want to buy something that costs more than usual. What do you do?',
-            'options': [
-                {'text': 'Buy it immediately if I want it', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Consider it briefly, then decide yes/no', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Sleep on it, budget for it', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Talk myself out of it', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Feel guilty even thinking about it', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_5',
-            'category': 'money',
-            'text': 'Money shows up unexpectedly (refund, gift, bonus). Your first thought is:',
-            'options': [
-                {'text': '"Hell yes, more abundance coming!"', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': '"This is awesome, what do I want to do with it?"', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': '"Cool, I\'ll save/invest it"', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': '"Better save this for the next emergency"', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': '"It won\'t last" or "What\'s the catch?"', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_6',
-            'category': 'money',
-            'text': 'Someone owes you money and doesn\'t pay you back. How do you feel?',
-            'options': [
-                {'text': 'Unbothered, money flows easily to me', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I bring it up directly without anger', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Annoyed but I let it go', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Betrayed, I trusted them', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Furious, they took advantage of me', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        },
-        {
-            'id': 'money_7',
-            'category': 'money',
-            'text': 'You\'re at dinner with friends. The bill comes. What happens internally?',
-            'options': [
-                {'text': 'I happily pay for everyone', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I\'m fine with splitting evenly', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I calculate exactly what I owe', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I hope someone else grabs it', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I feel anxious about the amount', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ]
-        }
-    ]
-    
-    # FAMILY QUESTIONS - Conditional based on children
-    # Non-parents (7 questions)
-    family_non_parents = [
-        {
-            'id': 'family_non_parents_1',
-            'category': 'family',
-            'text': 'Your phone rings. It\'s a family member. What\'s your gut reaction?',
-            'options': [
-                {'text': 'Happy, I want to answer', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Neutral, I\'ll take the call', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Depends on who it is', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Slight dread, "What do they want?"', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I let it go to voicemail', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_2',
-            'category': 'family',
-            'text': 'Family gathering coming up. How do you feel about it?',
-            'options': [
-                {'text': 'Excited, can\'t wait', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Looking forward to it', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'It\'s fine, I\'ll go', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Obligated, already dreading it', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Anxious, considering excuses to skip', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_3',
-            'category': 'family',
-            'text': 'A family member asks for your help (money, time, favor). What\'s your immediate feeling?',
-            'options': [
-                {'text': 'Happy to help, no hesitation', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Willing, I\'ll figure it out', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I\'ll do it but it\'s inconvenient', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Resentful, they always ask me', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Angry, I feel used', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_4',
-            'category': 'family',
-            'text': 'Your family criticizes a decision you made. What happens?',
-            'options': [
-                {'text': 'I listen, take what\'s useful, let go of the rest', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Slightly annoyed but I\'m confident in my choice', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Defensive but I hear them out', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Hurt, they don\'t support me', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Furious or devastated', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_5',
-            'category': 'family',
-            'text': 'You think about your childhood. What\'s the dominant feeling?',
-            'options': [
-                {'text': 'Grateful, good memories', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Mixed but mostly positive', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Neutral, it was what it was', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Painful, lots of wounds', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Traumatic, I avoid thinking about it', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_6',
-            'category': 'family',
-            'text': 'A family member succeeds at something big. What\'s your honest reaction?',
-            'options': [
-                {'text': 'Genuinely thrilled for them', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Happy, I celebrate with them', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': '"That\'s nice" (no strong feeling)', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Envious or compared to my life', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Bitter, "Why not me?"', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        },
-        {
-            'id': 'family_non_parents_7',
-            'category': 'family',
-            'text': 'You think about your family\'s influence on your life. What comes up?',
-            'options': [
-                {'text': 'Grateful for their support and guidance', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'They\'ve shaped me in positive ways', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Mixed feelings, some good some challenging', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'They\'ve held me back in some ways', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I need to break free from their influence', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => !value'
-            }
-        }
-    ]
-    
-    # Parents with young children (1-9 years old) - 7 questions
-    family_parents_young = [
-        {
-            'id': 'family_parents_young_1',
-            'category': 'family',
-            'text': 'Your child comes to you upset about something. What\'s your immediate response?',
-            'options': [
-                {'text': 'I listen fully and help them process their feelings', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I comfort them and ask what they need', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I try to fix the problem quickly', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I feel overwhelmed and want to escape', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I get frustrated and tell them to toughen up', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_2',
-            'category': 'family',
-            'text': 'You have to discipline your child. How do you approach it?',
-            'options': [
-                {'text': 'I stay calm and explain the consequences', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I set clear boundaries with love', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I try to be fair but it\'s hard', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I feel guilty and inconsistent', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I lose my temper and regret it', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_3',
-            'category': 'family',
-            'text': 'You think about your child\'s future. What\'s your dominant feeling?',
-            'options': [
-                {'text': 'Excited about their potential', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Hopeful and optimistic', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Mixed feelings, some worry', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Anxious about the world they\'ll face', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Terrified I\'m not preparing them well', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_4',
-            'category': 'family',
-            'text': 'Your child achieves something significant. What\'s your reaction?',
-            'options': [
-                {'text': 'Proud and celebrating their growth', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Happy and encouraging', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Pleased but trying not to overreact', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'Relieved they\'re doing well', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'Worried about expectations', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_5',
-            'category': 'family',
-            'text': 'You have to balance work and parenting. How do you feel?',
-            'options': [
-                {'text': 'I\'ve found a rhythm that works', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'It\'s challenging but manageable', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Some days are better than others', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I feel pulled in too many directions', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I\'m constantly failing at both', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_6',
-            'category': 'family',
-            'text': 'Your child makes a mistake or gets in trouble. What happens?',
-            'options': [
-                {'text': 'I help them learn from it', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I stay calm and address it', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I feel disappointed but try to help', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I worry about what this means', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I feel like I\'ve failed as a parent', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        },
-        {
-            'id': 'family_parents_young_7',
-            'category': 'family',
-            'text': 'You think about your parenting style. How do you feel?',
-            'options': [
-                {'text': 'Confident in my approach', 'value': 5, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'Mostly good with room to grow', 'value': 4, 'emoji': '🟢', 'greenLine': 'above'},
-                {'text': 'I\'m figuring it out as I go', 'value': 3, 'emoji': '⚪', 'greenLine': 'neutral'},
-                {'text': 'I doubt myself a lot', 'value': 2, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'I feel like I\'m doing it wrong', 'value': 1, 'emoji': '🔴', 'greenLine': 'below'},
-                {'text': 'None of these specifically resonate', 'value': 0, 'emoji': '🤔', 'greenLine': 'neutral', 'isCustom': True}
-            ],
-            'conditionalLogic': {
-                'field': 'has_children',
-                'condition': '(value) => value === true'
-            }
-        }
-    ]
-    
-    # Add all questions to the main list
-    questions.extend(money_questions)
-    questions.extend(family_non_parents)
-    questions.extend(family_parents_young)
-    
-    # Convert questions to TypeScript format
-    for i, question in enumerate(questions):
-        ts_content += f'''  {{
-    id: '{question['id']}',
-    category: '{question['category']}',
-    text: '{question['text']}',
-    options: [
+TS_CONDITIONS = '''export function evaluateCondition(when: ConditionDescriptor, value: unknown): boolean {
+  switch (when.op) {
+    case 'truthy': return !!value
+    case 'falsy': return !value
+    case 'eq': return value === when.value
+    case 'neq': return value !== when.value
+    case 'in': return when.values.includes(value as ConditionValue)
+    case 'not_in': return !when.values.includes(value as ConditionValue)
+  }
+}
+
+// condition() is kept for existing callers; it evaluates the descriptor
+const logic = (field: string, when: ConditionDescriptor): ConditionalLogic => ({
+  field,
+  when,
+  condition: (value) => evaluateCondition(when, value)
+})
+
+export function isQuestionVisible(question: AssessmentQuestion, profile: Record<string, unknown>): boolean {
+  return !question.conditionalLogic || evaluateCondition(question.conditionalLogic.when, profile[question.conditionalLogic.field])
+}
+
 '''
-        
-        for option in question['options']:
-            ts_content += f'''      {{
-        text: '{option['text']}',
-        value: {option['value']},
-        emoji: '{option['emoji']}',
-        greenLine: '{option['greenLine']}'{', isCustom: true' if option.get('isCustom') else ''}
-      }},
+
+# Rebuilds questions from the tables write_typescript_interned() emits
+TS_DECODE = '''export type Str = string | number  // literal, or index into S
+export type Opt = number | [Str, number, Str, number, number?]  // index into O, or inline
+
+const GREEN_LINES = ['above', 'neutral', 'below'] as const
+
+function decodeQuestions(
+  S: string[],
+  O: Exclude<Opt, number>[],
+  C: ConditionalLogic[],
+  Q: [string, Str, Str, Opt[], number?][]
+): AssessmentQuestion[] {
+  const str = (v: Str) => (typeof v === 'number' ? S[v] : v)
+  const option = ([text, value, emoji, greenLine, isCustom]: Exclude<Opt, number>): QuestionOption => ({
+    text: str(text), value, emoji: str(emoji), greenLine: GREEN_LINES[greenLine],
+    ...(isCustom ? { isCustom: true } : {})
+  })
+  const shared = O.map(option)
+  return Q.map(([id, category, text, options, condition]) => ({
+    id,
+    category: str(category),
+    text: str(text),
+    options: options.map((o) => (typeof o === 'number' ? shared[o] : option(o))),
+    ...(condition !== undefined ? { conditionalLogic: C[condition] } : {})
+  }))
+}
+
 '''
-        
-        ts_content += '    ]'
-        
-        if 'conditionalLogic' in question:
-            ts_content += f''',
-    conditionalLogic: {{
-      field: '{question['conditionalLogic']['field']}',
-      condition: {question['conditionalLogic']['condition']}
-    }}'''
-        
-        ts_content += '\n  }'
-        
-        if i < len(questions) - 1:
-            ts_content += ','
-        ts_content += '\n'
-    
-    # Close the array and export
-    ts_content += ''']
-
-export default assessmentQuestions
+
+TS_HEADER = TS_TYPES + TS_CONDITIONS
+
+# Shared by the per-category chunks
+TS_RUNTIME = (TS_TYPES + TS_CONDITIONS.replace('\nconst logic', '\nexport const logic')
+              + TS_DECODE.replace('\nfunction decodeQuestions', '\nexport function decodeQuestions'))
+CHUNK_IMPORTS = '''import { evaluateCondition, logic } from '../runtime'
+import type { AssessmentQuestion } from '../runtime'
+
+'''
+CHUNK_IMPORTS_INTERNED = '''import { decodeQuestions, evaluateCondition, logic } from '../runtime'
+import type { AssessmentQuestion, ConditionalLogic, Opt, Str } from '../runtime'
+
+'''
+
+TS_VISIBILITY = '''
+export const questionsById: Record<string, AssessmentQuestion> = Object.fromEntries(
+  assessmentQuestions.map((q) => [q.id, q])
+)
+
+/**
+ * Re-evaluate only the questions that depend on `field` after it changes.
+ * Updates `visibility` (question id -> visible) in place and returns the ids that flipped.
+ */
+export function updateVisibility(visibility: Record<string, boolean>, field: string, value: unknown): string[] {
+  const changed: string[] = []
+  for (const id of conditionDependencies[field] ?? []) {
+    const visible = evaluateCondition(questionsById[id].conditionalLogic!.when, value)
+    if (visibility[id] !== visible) {
+      visibility[id] = visible
+      changed.push(id)
+    }
+  }
+  return changed
+}
 '''
-    
-    return ts_content
+
+
+class CatalogError(ValueError):
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} catalog error(s):\n  ' + '\n  '.join(errors))
+        self.errors = errors
+
+
+# ---------------------------------------------------------------------------
+# Catalog
+# ---------------------------------------------------------------------------
+
+def load_catalog(catalog_dir=CATALOG_DIR):
+    """Read every <category>.json and return validated questions in category order."""
+    files = sorted(Path(catalog_dir).glob('*.json'))
+    if not files:
+        raise CatalogError([f'No catalog files in {catalog_dir}'])
+
+    errors = []
+    by_category = {}
+    for path in files:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            errors.append(f'{path.name}: invalid JSON ({e})')
+            continue
+        category = data.get('category')
+        if category != path.stem:
+            errors.append(f'{path.name}: category {category!r} does not match the file name')
+        by_category[path.stem] = [
+            {'id': q.get('id'), 'category': category, **{k: v for k, v in q.items() if k != 'id'}}
+            for q in data.get('questions', [])
+        ]
+
+    questions = []
+    for category in sorted(by_category, key=lambda c: CATEGORIES.index(c) if c in CATEGORIES else len(CATEGORIES)):
+        questions.extend(by_category[category])
+
+    # Lambdas copied from the hand-written questions.ts compile to descriptors
+    for question in questions:
+        logic = question.get('conditionalLogic')
+        if isinstance(logic, dict) and 'when' not in logic and isinstance(logic.get('condition'), str):
+            when = compile_condition(logic['condition'])
+            if when is not None:
+                question['conditionalLogic'] = {'field': logic.get('field'), 'when': when}
+
+    errors.extend(validate_catalog(questions))
+    if errors:
+        raise CatalogError(errors)
+    return questions
+
+
+def validate_catalog(questions):
+    """Return a list of problems with the catalog (empty when it is valid)."""
+    errors = []
+    seen = set()
+    for question in questions:
+        qid = question.get('id')
+        where = qid or '<question without id>'
+        if not isinstance(qid, str) or not ID_PATTERN.match(qid):
+            errors.append(f'{where}: id must match {ID_PATTERN.pattern}')
+        elif qid in seen:
+            errors.append(f'{qid}: duplicate id')
+        seen.add(qid)
+
+        if question['category'] not in CATEGORIES:
+            errors.append(f'{where}: unknown category {question["category"]!r}')
+        if not isinstance(question.get('text'), str) or not question['text'].strip():
+            errors.append(f'{where}: missing text')
+
+        options = question.get('options')
+        if not isinstance(options, list) or not options:
+            errors.append(f'{where}: needs at least one option')
+            options = []
+        custom = 0
+        for i, option in enumerate(options):
+            label = f'{where} option {i + 1}'
+            if not isinstance(option.get('text'), str) or not option['text'].strip():
+                errors.append(f'{label}: missing text')
+            value = option.get('value')
+            if not isinstance(value, int) or isinstance(value, bool) or not MIN_VALUE <= value <= MAX_VALUE:
+                errors.append(f'{label}: value must be an integer {MIN_VALUE}-{MAX_VALUE}')
+            if not isinstance(option.get('emoji'), str) or not option['emoji']:
+                errors.append(f'{label}: missing emoji')
+            if option.get('greenLine') not in GREEN_LINES:
+                errors.append(f'{label}: greenLine must be one of {", ".join(GREEN_LINES)}')
+            if option.get('isCustom'):
+                custom += 1
+            unknown = set(option) - {'text', 'value', 'emoji', 'greenLine', 'isCustom'}
+            if unknown:
+                errors.append(f'{label}: unknown keys {sorted(unknown)}')
+        if custom > 1:
+            errors.append(f'{where}: more than one custom option')
+
+        logic = question.get('conditionalLogic')
+        if logic is None:
+            continue
+        if not isinstance(logic, dict) or not isinstance(logic.get('field'), str) or not logic['field']:
+            errors.append(f'{where}: conditionalLogic needs a field')
+        elif 'when' not in logic and 'condition' in logic:
+            errors.append(f'{where}: cannot compile condition {logic["condition"]!r}, use a "when" descriptor')
+        else:
+            errors.extend(f'{where}: {e}' for e in condition_errors(logic.get('when')))
+            unknown = set(logic) - {'field', 'when'}
+            if unknown:
+                errors.append(f'{where}: conditionalLogic has unknown keys {sorted(unknown)}')
+    return errors
+
+
+# ---------------------------------------------------------------------------
+# Conditions
+# ---------------------------------------------------------------------------
+
+def condition_errors(when):
+    """Problems with one condition descriptor."""
+    if not isinstance(when, dict) or when.get('op') not in CONDITION_OPS:
+        return [f'conditionalLogic.when.op must be one of {", ".join(CONDITION_OPS)}']
+    errors = []
+    required = CONDITION_OPS[when['op']]
+    missing = [key for key in required if key not in when]
+    if missing:
+        errors.append(f'conditionalLogic.when {when["op"]!r} needs {", ".join(missing)}')
+    unknown = set(when) - {'op', *required}
+    if unknown:
+        errors.append(f'conditionalLogic.when has unknown keys {sorted(unknown)}')
+    values = [when['value']] if 'value' in when else when.get('values', [])
+    if 'values' in when and (not isinstance(when['values'], list) or not when['values']):
+        errors.append('conditionalLogic.when.values must be a non-empty list')
+    elif any(v is not None and not isinstance(v, (str, int, float, bool)) for v in values):
+        errors.append('conditionalLogic.when values must be strings, numbers, booleans or null')
+    return errors
+
+
+def js_literal(text):
+    if text in ('true', 'false', 'null'):
+        return {'true': True, 'false': False, 'null': None}[text]
+    if text[0] in '\'"':
+        return text[1:-1]
+    return json.loads(text)
+
+
+def compile_condition(source):
+    """Compile a '(value) => ...' lambda into a descriptor, or None if it is not understood.
+
+    Handles !v, !!v, v, v === x, v !== x, and chains of v === x || v === y
+    (-> in) or v !== x && v !== y (-> not_in) where x, y are literals.
+    """
+    match = LAMBDA_PATTERN.match(source.strip())
+    if not match:
+        return None
+    name, body = match.groups()
+    if body == f'!{name}':
+        return {'op': 'falsy'}
+    if body in (name, f'!!{name}', f'Boolean({name})'):
+        return {'op': 'truthy'}
+    for joiner, comparison, single, multi in (('||', '===', 'eq', 'in'), ('&&', '!==', 'neq', 'not_in')):
+        values = []
+        for term in body.split(joiner):
+            left, found, right = (part.strip() for part in term.partition(comparison))
+            if not found or left != name or not LITERAL_PATTERN.match(right):
+                break
+            values.append(js_literal(right))
+        else:
+            return {'op': single, 'value': values[0]} if len(values) == 1 else {'op': multi, 'values': values}
+    return None
+
+
+def js_truthy(value):
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, (int, float)):
+        return value == value and value != 0
+    if isinstance(value, str):
+        return value != ''
+    return True
+
+
+def js_equal(a, b):
+    """JavaScript === for JSON scalars (True is not 1)."""
+    return isinstance(a, bool) == isinstance(b, bool) and a == b
+
+
+def evaluate_condition(when, value):
+    """Python twin of evaluateCondition() in the generated module."""
+    op = when['op']
+    if op == 'truthy':
+        return js_truthy(value)
+    if op == 'falsy':
+        return not js_truthy(value)
+    if op == 'eq':
+        return js_equal(value, when['value'])
+    if op == 'neq':
+        return not js_equal(value, when['value'])
+    found = any(js_equal(value, v) for v in when['values'])
+    return found if op == 'in' else not found
+
+
+def is_visible(question, profile):
+    logic = question.get('conditionalLogic')
+    return not logic or evaluate_condition(logic['when'], profile.get(logic['field']))
+
+
+def dependency_index(questions):
+    """{profile field: [ids of the questions whose condition reads it]}"""
+    index = {}
+    for question in questions:
+        logic = question.get('conditionalLogic')
+        if logic:
+            index.setdefault(logic['field'], []).append(question['id'])
+    return dict(sorted(index.items()))
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def ts_string(value):
+    """Single-quoted TypeScript string literal."""
+    escaped = (value.replace('\\', '\\\\').replace("'", "\\'")
+               .replace('\n', '\\n').replace('\r', '\\r').replace('\u2028', '\\u2028').replace('\u2029', '\\u2029'))
+    return f"'{escaped}'"
+
+
+def ts_json(value):
+    """A JSON value (condition descriptor) as a TypeScript literal."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return ts_string(value)
+    if isinstance(value, list):
+        return '[' + ', '.join(ts_json(v) for v in value) + ']'
+    if isinstance(value, dict):
+        return '{ ' + ', '.join(f'{k}: {ts_json(v)}' for k, v in value.items()) + ' }'
+    return json.dumps(value)
+
+
+def write_dependencies(questions, out):
+    """The field -> question ids index and the visibility helpers built on it."""
+    out.write('\n// Profile field -> ids of the questions whose condition reads it\n'
+              'export const conditionDependencies: Record<string, string[]> = {\n')
+    index = dependency_index(questions)
+    for i, (field, ids) in enumerate(index.items()):
+        out.write(f"  {ts_string(field)}: [{', '.join(ts_string(qid) for qid in ids)}]"
+                  f"{',' if i < len(index) - 1 else ''}\n")
+    out.write('}\n')
+    out.write(TS_VISIBILITY)
+
+
+def write_typescript_expanded(questions, out, prelude=TS_HEADER):
+    """One object literal per question and option."""
+    out.write(prelude)
+    out.write('export const assessmentQuestions: AssessmentQuestion[] = [\n')
+    for i, question in enumerate(questions):
+        out.write('  {\n')
+        out.write(f"    id: {ts_string(question['id'])},\n")
+        out.write(f"    category: {ts_string(question['category'])},\n")
+        out.write(f"    text: {ts_string(question['text'])},\n")
+        out.write('    options: [\n')
+        for j, option in enumerate(question['options']):
+            out.write(f"      {{ text: {ts_string(option['text'])}, value: {option['value']}, "
+                      f"emoji: {ts_string(option['emoji'])}, greenLine: {ts_string(option['greenLine'])}")
+            if option.get('isCustom'):
+                out.write(', isCustom: true')
+            out.write(' },\n' if j < len(question['options']) - 1 else ' }\n')
+        out.write('    ]')
+        if 'conditionalLogic' in question:
+            logic = question['conditionalLogic']
+            out.write(f",\n    conditionalLogic: logic({ts_string(logic['field'])}, {ts_json(logic['when'])})")
+        out.write('\n  },\n' if i < len(questions) - 1 else '\n  }\n')
+    out.write(']\n')
+    write_dependencies(questions, out)
+    out.write('\nexport default assessmentQuestions\n')
+
+
+def intern_catalog(questions):
+    """Split the catalog into shared tables of repeated strings and options.
+
+    Only values that occur more than once are interned; unique text stays
+    inline, where it compresses better than an index. Returns
+    (strings, options, conditions, rows) where a string field is either a
+    literal or an index into ``strings``, an option is either an index into
+    ``options`` or an inline (text, value, emoji, greenLine, isCustom) tuple,
+    and rows are (id, category, text, options, condition index or None).
+    """
+    def option_key(option):
+        return (option['text'], option['value'], option['emoji'], option['greenLine'], bool(option.get('isCustom')))
+
+    string_counts = Counter()
+    option_counts = Counter()
+    for question in questions:
+        string_counts.update([question['category'], question['text']])
+        for option in question['options']:
+            option_counts[option_key(option)] += 1
+    for key in option_counts:
+        # Each distinct option's strings are written once: a shared option in
+        # the option table, a unique one inline
+        string_counts.update([key[0], key[2]])
+
+    strings = [value for value, count in string_counts.items() if count > 1]
+    string_index = {value: i for i, value in enumerate(strings)}
+    ref = lambda value: string_index.get(value, value)
+
+    def encode(key):
+        text, value, emoji, green_line, custom = key
+        return (ref(text), value, ref(emoji), GREEN_LINES.index(green_line), 1 if custom else 0)
+
+    options = [encode(key) for key, count in option_counts.items() if count > 1]
+    option_index = {key: i for i, key in enumerate(k for k, c in option_counts.items() if c > 1)}
+
+    conditions = []
+    condition_index = {}
+    rows = []
+    for question in questions:
+        logic = question.get('conditionalLogic')
+        condition = None
+        if logic:
+            key = (logic['field'], json.dumps(logic['when'], sort_keys=True))
+            condition = condition_index.setdefault(key, len(conditions))
+            if condition == len(conditions):
+                conditions.append((logic['field'], logic['when']))
+        rows.append((
+            question['id'],
+            ref(question['category']),
+            ref(question['text']),
+            [option_index.get(option_key(o), encode(option_key(o))) for o in question['options']],
+            condition,
+        ))
+    return strings, options, conditions, rows
+
+
+def ts_value(value):
+    """A literal, an interned index or a nested tuple as TypeScript."""
+    if isinstance(value, str):
+        return ts_string(value)
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(ts_value(v) for v in value) + ']'
+    return str(value)
+
+
+def write_typescript_interned(questions, out, prelude=TS_HEADER + TS_DECODE):
+    """The TypeScript module with repeated values interned into tables.
+
+    Repeated strings (emojis, categories) and options shared by several
+    questions (the "None of these" option) are emitted once and referenced
+    by array index; ``decodeQuestions()`` rebuilds ``assessmentQuestions``
+    from the tables at module load. ``prelude`` holds the types and helpers,
+    or the import of them from runtime.ts for a chunk.
+    """
+    strings, options, conditions, rows = intern_catalog(questions)
+
+    out.write(prelude)
+    out.write('// Strings used more than once\nconst S: string[] = [\n')
+    for i, value in enumerate(strings):
+        out.write(f"  {ts_string(value)}{',' if i < len(strings) - 1 else ''}\n")
+    out.write(']\n\n')
+
+    out.write('// Options shared by several questions: [text, value, emoji, greenLine, isCustom]\n'
+              'const O: Exclude<Opt, number>[] = [\n')
+    for i, entry in enumerate(options):
+        out.write(f"  {ts_value(entry)}{',' if i < len(options) - 1 else ''}\n")
+    out.write(']\n\n')
+
+    out.write('const C: ConditionalLogic[] = [\n')
+    for i, (field, when) in enumerate(conditions):
+        out.write(f"  logic({ts_string(field)}, {ts_json(when)}){',' if i < len(conditions) - 1 else ''}\n")
+    out.write(']\n\n')
+
+    out.write('// [id, category, text, options, condition?]\n'
+              'const Q: [string, Str, Str, Opt[], number?][] = [\n')
+    for i, (qid, category, text, question_options, condition) in enumerate(rows):
+        out.write(f"  [{ts_string(qid)}, {ts_value(category)}, {ts_value(text)}, [\n")
+        for j, entry in enumerate(question_options):
+            if isinstance(entry, tuple) and not entry[4]:
+                entry = entry[:4]
+            out.write(f"    {ts_value(entry)}{',' if j < len(question_options) - 1 else ''}\n")
+        tail = f', {condition}' if condition is not None else ''
+        out.write(f"  ]{tail}]{',' if i < len(rows) - 1 else ''}\n")
+    out.write(']\n\n')
+
+    out.write('export const assessmentQuestions: AssessmentQuestion[] = decodeQuestions(S, O, C, Q)\n')
+    write_dependencies(questions, out)
+    out.write('\nexport default assessmentQuestions\n')
+
+
+def gzip_size(text):
+    return len(gzip.compress(text.encode('utf-8'), 9))
+
+
+def chunk_imports(questions):
+    """The runtime.ts imports of a chunk's expanded and interned forms.
+
+    ``logic`` is only imported when a question in the chunk has a condition.
+    """
+    imports = (CHUNK_IMPORTS, CHUNK_IMPORTS_INTERNED)
+    if any(question.get('conditionalLogic') for question in questions):
+        return imports
+    return tuple(prelude.replace(', logic }', ' }', 1) for prelude in imports)
+
+
+def bundle_sizes(questions, chunk=False):
+    """Raw and gzip sizes of the expanded and interned forms of one module."""
+    expanded, interned = chunk_imports(questions) if chunk else (TS_HEADER, TS_HEADER + TS_DECODE)
+    sizes = {}
+    for name, writer, prelude in (('expanded', write_typescript_expanded, expanded),
+                                  ('interned', write_typescript_interned, interned)):
+        text = render(lambda q, out: writer(q, out, prelude), questions)
+        sizes[name] = {'raw': len(text.encode('utf-8')), 'gzip': gzip_size(text), 'text': text}
+    return sizes
+
+
+def write_typescript(questions, out, chunk=False):
+    """Write whichever form of the module is smaller once gzipped.
+
+    Browsers download the gzipped bundle, and gzip already removes most of
+    the repetition interning targets; on a small catalog the tables and the
+    decoder can cost more than they save. ``chunk`` imports the types and
+    helpers from runtime.ts instead of inlining them.
+    """
+    sizes = bundle_sizes(questions, chunk)
+    form = 'interned' if sizes['interned']['gzip'] < sizes['expanded']['gzip'] else 'expanded'
+    out.write(sizes[form]['text'])
+    return form
+
+
+def write_json(questions, out):
+    """Stream the catalog as JSON to the text file ``out``.
+
+    Conditions are descriptors, so the file is plain data: evaluate them with
+    evaluate_condition() here or evaluateCondition() in TypeScript, no eval.
+    """
+    categories = [c for c in CATEGORIES if any(q['category'] == c for q in questions)]
+    json.dump({'categories': categories, 'questions': questions, 'dependencies': dependency_index(questions)},
+              out, ensure_ascii=False, separators=(',', ':'))
+    out.write('\n')
+
+
+def write_file(path, writer, questions):
+    """Write through a buffered file, replacing ``path`` only once it is complete."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER) as out:
+        writer(questions, out)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+# ---------------------------------------------------------------------------
+# Scoring matrix
+# ---------------------------------------------------------------------------
+
+def field_probes(whens):
+    """Profile values that exercise every outcome of the conditions on one field."""
+    probes = [True, False, None]
+    for when in whens:
+        probes.extend([when['value']] if 'value' in when else when.get('values', []))
+    if any(value is not None and not isinstance(value, bool) for value in probes):
+        probes.append(OTHER_VALUE)
+    unique = {}
+    for value in probes:
+        unique.setdefault((type(value).__name__, value), value)
+    return list(unique.values())
+
+
+def condition_branches(questions):
+    """Distinct sets of visible questions, one per reachable combination of profile values.
+
+    Returns [{'profile': {field: value}, 'questions': [index into questions]}],
+    with profiles that show the same questions collapsed into the first one.
+    """
+    whens = {}
+    for question in questions:
+        logic = question.get('conditionalLogic')
+        if logic:
+            whens.setdefault(logic['field'], []).append(logic['when'])
+    fields = sorted(whens)
+
+    branches = []
+    seen = set()
+    for values in itertools.product(*(field_probes(whens[field]) for field in fields)):
+        profile = dict(zip(fields, values))
+        visible = tuple(i for i, question in enumerate(questions) if is_visible(question, profile))
+        if visible not in seen:
+            seen.add(visible)
+            branches.append({'profile': profile, 'questions': list(visible)})
+    return branches
+
+
+def scoring_matrix(questions):
+    """Question x option -> value and green-line code, plus per-branch maxima per category.
+
+    ``values`` and ``greenLine`` are padded with -1 to the widest question so
+    they load straight into 2-D arrays; ``greenLine`` codes index ``greenLines``.
+    ``conditions`` holds each question's {field, when} descriptor (or None).
+    """
+    categories = [c for c in CATEGORIES if any(q['category'] == c for q in questions)]
+    width = max(len(q['options']) for q in questions)
+    index = {q['id']: i for i, q in enumerate(questions)}
+
+    branches = {}
+    for category in categories:
+        category_questions = [q for q in questions if q['category'] == category]
+        branches[category] = []
+        for branch in condition_branches(category_questions):
+            visible = [category_questions[i] for i in branch['questions']]
+            branches[category].append({
+                'profile': branch['profile'],
+                'questions': [index[q['id']] for q in visible],
+                'maxScore': len(visible) * MAX_VALUE,
+                'maxOptionScore': sum(max(o['value'] for o in q['options']) for q in visible),
+            })
+
+    return {
+        'catalog': content_hash(json.dumps(questions, sort_keys=True, ensure_ascii=False)),
+        'maxScorePerQuestion': MAX_VALUE,
+        'thresholds': GREEN_LINE_THRESHOLDS,
+        'greenLines': list(GREEN_LINES),
+        'categories': categories,
+        'questions': [q['id'] for q in questions],
+        'category': [categories.index(q['category']) for q in questions],
+        'optionText': [[o['text'] for o in q['options']] for q in questions],
+        'values': [[o['value'] for o in q['options']] + [-1] * (width - len(q['options'])) for q in questions],
+        'greenLine': [[GREEN_LINES.index(o['greenLine']) for o in q['options']] + [-1] * (width - len(q['options']))
+                      for q in questions],
+        'conditions': [q.get('conditionalLogic') for q in questions],
+        'branches': branches,
+    }
+
+
+def write_scoring(questions, out):
+    json.dump(scoring_matrix(questions), out, ensure_ascii=False, separators=(',', ':'))
+    out.write('\n')
+
+
+# ---------------------------------------------------------------------------
+# Category chunks
+# ---------------------------------------------------------------------------
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def render(writer, questions):
+    out = StringIO()
+    writer(questions, out)
+    return out.getvalue()
+
+
+def write_if_changed(path, text):
+    """Write ``text`` unless ``path`` already holds it; keeps mtimes stable for watchers."""
+    path = Path(path)
+    if path.exists() and path.read_text(encoding='utf-8') == text:
+        return False
+    write_file(path, lambda _, out: out.write(text), None)
+    return True
+
+
+def write_chunk(questions, out):
+    write_typescript(questions, out, chunk=True)
+
+
+def read_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_manifest_ts(manifest, out):
+    out.write('// Generated by scripts/database/build_questions.py from the category chunks\n'
+              "import type { AssessmentQuestion } from './runtime'\n\n"
+              'export interface QuestionChunk {\n'
+              '  hash: string\n'
+              '  questions: number\n'
+              '  fields: string[]\n'
+              '  load: () => Promise<{ default: AssessmentQuestion[] }>\n'
+              '}\n\n'
+              f"export const runtimeHash = {ts_string(manifest['runtime']['hash'])}\n\n"
+              'export const questionChunks: Record<string, QuestionChunk> = {\n')
+    chunks = manifest['categories']
+    for i, (category, entry) in enumerate(chunks.items()):
+        fields = ', '.join(ts_string(field) for field in entry['fields'])
+        out.write(f"  {ts_string(category)}: {{ hash: {ts_string(entry['hash'])}, questions: {entry['questions']}, "
+                  f"fields: [{fields}], load: () => import({ts_string('./' + entry['file'][:-3])}) }}"
+                  f"{',' if i < len(chunks) - 1 else ''}\n")
+    out.write('}\n\n'
+              'export async function loadCategoryQuestions(category: string): Promise<AssessmentQuestion[]> {\n'
+              '  const chunk = questionChunks[category]\n'
+              '  return chunk ? (await chunk.load()).default : []\n'
+              '}\n')
+
+
+def build_chunks(questions, out_dir, force=False):
+    """Write one module per category plus the manifest, skipping unchanged categories.
+
+    A category is regenerated only when its catalog entries or this script
+    changed (or its chunk was edited by hand), so unchanged chunks keep their
+    bytes and their content hash. Returns (manifest, rebuilt categories).
+    """
+    out_dir = Path(out_dir)
+    chunk_dir = out_dir / 'categories'
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / 'manifest.json'
+
+    generator = content_hash(Path(__file__).read_bytes())
+    previous = read_manifest(manifest_path)
+    if force or previous.get('generator') != generator:
+        previous = {}
+
+    write_if_changed(out_dir / 'runtime.ts', TS_RUNTIME)
+
+    by_category = {}
+    for question in questions:
+        by_category.setdefault(question['category'], []).append(question)
+
+    entries = {}
+    rebuilt = []
+    for category, category_questions in by_category.items():
+        path = chunk_dir / f'{category}.ts'
+        source = content_hash(json.dumps(category_questions, sort_keys=True, ensure_ascii=False))
+        old = previous.get('categories', {}).get(category)
+        if old and old['source'] == source and path.exists() and content_hash(path.read_bytes()) == old['hash']:
+            entries[category] = old
+            continue
+
+        text = render(write_chunk, category_questions)
+        write_if_changed(path, text)
+        entries[category] = {
+            'file': f'categories/{category}.ts',
+            'hash': content_hash(text),
+            'source': source,
+            'questions': len(category_questions),
+            'fields': list(dependency_index(category_questions)),
+        }
+        rebuilt.append(category)
+
+    for path in chunk_dir.glob('*.ts'):
+        if path.stem not in entries:
+            path.unlink()
+
+    manifest = {
+        'generator': generator,
+        'runtime': {'file': 'runtime.ts', 'hash': content_hash(TS_RUNTIME)},
+        'categories': entries,
+    }
+    write_if_changed(out_dir / 'manifest.ts', render(write_manifest_ts, manifest))
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2) + '\n')
+    return manifest, rebuilt
+
+
+def create_questions_file(catalog_dir=CATALOG_DIR):
+    """Create the complete questions.ts content with conditional logic"""
+    out = StringIO()
+    write_typescript(load_catalog(catalog_dir), out)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate assessment questions from the catalog')
+    parser.add_argument('--catalog', default=str(CATALOG_DIR), help='Directory of <category>.json files')
+    parser.add_argument('--out-dir', default=str(OUT_DIR), help='Where to write questions.ts / questions.json')
+    parser.add_argument('--force', action='store_true', help='Regenerate every category chunk')
+    args = parser.parse_args()
+
+    try:
+        questions = load_catalog(args.catalog)
+    except CatalogError as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    ts_size = write_file(os.path.join(args.out_dir, 'questions.ts'), write_typescript, questions)
+    json_size = write_file(os.path.join(args.out_dir, 'questions.json'), write_json, questions)
+    scoring_size = write_file(os.path.join(args.out_dir, 'scoring.json'), write_scoring, questions)
+
+    categories = sorted({q['category'] for q in questions}, key=CATEGORIES.index)
+    conditional = sum(1 for q in questions if 'conditionalLogic' in q)
+    print(f'Generated questions file with {len(questions)} questions ({conditional} conditional)')
+    print(f'Categories included: {", ".join(categories)}')
+    print(f'  {args.out_dir}/questions.ts    {ts_size / 1024:.1f} KB')
+    print(f'  {args.out_dir}/questions.json  {json_size / 1024:.1f} KB')
+    print(f'  {args.out_dir}/scoring.json    {scoring_size / 1024:.1f} KB')
+
+    manifest, rebuilt = build_chunks(questions, args.out_dir, force=args.force)
+    unchanged = [c for c in manifest['categories'] if c not in rebuilt]
+    print(f'Chunks: {len(rebuilt)} regenerated ({", ".join(rebuilt) or "none"}), '
+          f'{len(unchanged)} unchanged ({", ".join(unchanged) or "none"})')
+    for category, entry in manifest['categories'].items():
+        print(f'  {args.out_dir}/{entry["file"]:<24} {entry["hash"]}')
+
+    sizes = bundle_sizes(questions)
+    expanded, interned = sizes['expanded'], sizes['interned']
+    form = 'interned' if interned['gzip'] < expanded['gzip'] else 'expanded'
+    print(f'Bundle: expanded {expanded["raw"] / 1024:.1f} KB (gzip {expanded["gzip"] / 1024:.1f} KB), '
+          f'interned {interned["raw"] / 1024:.1f} KB (gzip {interned["gzip"] / 1024:.1f} KB); '
+          f'questions.ts uses the {form} form')
+
 
 if __name__ == '__main__':
-    content = create_questions_file()
-    print(f'Generated questions file with {content.count("id:")} questions')
-    print('Categories included: money, family (conditional)')
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Bulk re-score assessments after option values or green lines change
+
+Loads exported assessment_responses into NumPy arrays, maps every answer to
+its option in the scoring matrix (by question id and option text) and then
+recomputes every assessment's category scores, percentages and green-line
+status in one vectorized pass. The rules are the same as the
+update_assessment_scores trigger and src/lib/assessment/scoring.ts:
+
+    - N/A responses are skipped, and a category's max is 5 x its answered questions
+    - percentages round half up
+    - a category is above the Green Line at >= 80%, in transition at >= 60%,
+      and below otherwise
+
+Answers that don't match an option keep their stored value. That covers
+custom responses, questions that are not in the catalog, and option text
+that has since been edited.
+
+Export the responses (CSV from psql, or the Parquet files of the backup
+Lambda's analytics export), then re-score:
+
+    psql "$DATABASE_URL" -c "\\copy (SELECT id, assessment_id, question_id, category,
+        response_value, response_text, green_line, is_not_applicable, is_custom_response
+        FROM assessment_responses) TO 'responses.csv' CSV HEADER"
+
+    python3 scripts/database/rescore_assessments.py responses.csv \\
+        [--matrix generated/scoring.json] [--out results.jsonl] [--sql rescore.sql]
+
+--out writes one row per assessment (.jsonl or .csv). --sql writes batched
+UPDATEs for changed responses and for assessment_results, to apply with psql -f.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from build_questions import CATALOG_DIR, CATEGORIES, CatalogError, load_catalog, scoring_matrix
+
+BATCH_SIZE = 5000
+CHUNK_ROWS = 500_000
+STATUSES = ('above', 'transition', 'below')  # GreenLineResult in scoring.ts
+TRUE_VALUES = {'t', 'true', '1', 'yes'}
+REQUIRED_COLUMNS = ('assessment_id', 'question_id', 'response_value', 'response_text')
+OPTIONAL_COLUMNS = ('id', 'category', 'green_line', 'is_not_applicable', 'is_custom_response')
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def read_chunks(paths, chunk_rows=CHUNK_ROWS):
+    """Yield {column: list} chunks from CSV (optionally .gz) or Parquet exports."""
+    for path in map(Path, paths):
+        files = sorted(path.rglob('*.parquet')) if path.is_dir() else [path]
+        for file in files:
+            if file.suffix == '.parquet':
+                yield from read_parquet(file, chunk_rows)
+            else:
+                yield from read_csv(file, chunk_rows)
+
+
+def read_csv(path, chunk_rows):
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [c for c in REQUIRED_COLUMNS if c not in header]
+        if missing:
+            raise ValueError(f'{path}: missing columns {", ".join(missing)}')
+        wanted = {name: header.index(name) for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if name in header}
+        while True:
+            rows = [row for _, row in zip(range(chunk_rows), reader)]
+            if not rows:
+                return
+            yield {name: [row[i] for row in rows] for name, i in wanted.items()}
+
+
+def read_parquet(path, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError(f'{path}: reading Parquet requires pyarrow (pip install pyarrow)')
+    parquet = pq.ParquetFile(path)
+    names = set(parquet.schema_arrow.names)
+    missing = [c for c in REQUIRED_COLUMNS if c not in names]
+    if missing:
+        raise ValueError(f'{path}: missing columns {", ".join(missing)}')
+    columns = [c for c in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if c in names]
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield {name: batch.column(name).to_pylist() for name in columns}
+
+
+def flags(values, n):
+    if values is None:
+        return np.zeros(n, dtype=bool)
+    return np.fromiter((str(v).lower() in TRUE_VALUES for v in values), dtype=bool, count=n)
+
+
+class ResponseLoader:
+    """Encodes response chunks against the scoring matrix into flat arrays.
+
+    Per response: assessment (index into ``assessment_ids``), category
+    (index into CATEGORIES, -1 if unknown), value and green-line code after
+    re-scoring, whether it is N/A and whether it matched an option.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.values = np.asarray(matrix['values'], dtype=np.int16)
+        self.green_lines = np.asarray(matrix['greenLine'], dtype=np.int8)
+        self.green_codes = {name: i for i, name in enumerate(matrix['greenLines'])}
+        self.category_codes = {name: i for i, name in enumerate(CATEGORIES)}
+        self.question_codes = {qid: i for i, qid in enumerate(matrix['questions'])}
+        # Trailing -1 so that "unknown question" (-1) indexes to -1
+        self.question_category = np.asarray(
+            [CATEGORIES.index(matrix['categories'][c]) for c in matrix['category']] + [-1], dtype=np.int8
+        )
+        self.options = {
+            (q, text): o for q, texts in enumerate(matrix['optionText']) for o, text in enumerate(texts)
+        }
+        self.assessment_codes = {}
+        self.parts = []
+        self.changed = []  # (response id, value, green line) for responses whose stored score changes
+
+    def add(self, columns):
+        n = len(columns['assessment_id'])
+        codes = self.assessment_codes
+        assessment = np.fromiter((codes.setdefault(v, len(codes)) for v in columns['assessment_id']),
+                                 dtype=np.int32, count=n)
+        question = np.fromiter((self.question_codes.get(v, -1) for v in columns['question_id']),
+                               dtype=np.int32, count=n)
+        option = np.fromiter((self.options.get(key, -1) for key in zip(question.tolist(), columns['response_text'])),
+                             dtype=np.int16, count=n)
+        option[flags(columns.get('is_custom_response'), n)] = -1
+
+        row_category = np.fromiter((self.category_codes.get(v, -1) for v in columns.get('category', [None] * n)),
+                                   dtype=np.int8, count=n)
+        category = np.where(question >= 0, self.question_category[question], row_category)
+        stored = np.asarray(columns['response_value']).astype(np.int16)
+        stored_green = np.fromiter((self.green_codes.get(v, -1) for v in columns.get('green_line', [None] * n)),
+                                   dtype=np.int8, count=n)
+
+        resolved = option >= 0
+        q = np.where(resolved, question, 0)
+        o = np.where(resolved, option, 0)
+        value = np.where(resolved, self.values[q, o], stored)
+        green = np.where(resolved, self.green_lines[q, o], stored_green)
+
+        if 'id' in columns:
+            ids = columns['id']
+            for i in np.flatnonzero(resolved & ((value != stored) | (green != stored_green))).tolist():
+                self.changed.append((ids[i], int(value[i]), self.matrix['greenLines'][green[i]]))
+
+        self.parts.append({
+            'assessment': assessment,
+            'category': category,
+            'value': value,
+            'green': green,
+            'not_applicable': flags(columns.get('is_not_applicable'), n),
+            'resolved': resolved,
+        })
+
+    def responses(self):
+        keys = ('assessment', 'category', 'value', 'green', 'not_applicable', 'resolved')
+        if not self.parts:
+            return {key: np.zeros(0, dtype=np.int32) for key in keys}
+        return {key: np.concatenate([part[key] for part in self.parts]) for key in keys}
+
+    @property
+    def assessment_ids(self):
+        return list(self.assessment_codes)
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def rescore(matrix, responses, assessments):
+    """Category and overall results for every assessment, as (assessments x categories) arrays.
+
+    Percentages and thresholds use exact integer arithmetic, matching the
+    NUMERIC maths of the update_assessment_scores trigger.
+    """
+    per_question = matrix['maxScorePerQuestion']
+    above, transition = matrix['thresholds']['above'], matrix['thresholds']['transition']
+    shape = (assessments, len(CATEGORIES))
+    size = shape[0] * shape[1]
+
+    known = responses['category'] >= 0
+    key = responses['assessment'].astype(np.int64) * shape[1] + responses['category']
+    # The trigger reports every category with a response, even if all are N/A
+    responded = np.bincount(key[known], minlength=size).reshape(shape)
+
+    counted = known & ~responses['not_applicable']
+    k = key[counted]
+    score = np.rint(np.bincount(k, weights=responses['value'][counted], minlength=size)).astype(np.int64).reshape(shape)
+    answered = np.bincount(k, minlength=size).reshape(shape)
+
+    graded = counted & (responses['green'] >= 0)
+    answers = np.bincount(key[graded] * 3 + responses['green'][graded], minlength=size * 3).reshape(shape + (3,))
+
+    max_score = answered * per_question
+    divisor = np.maximum(max_score, 1)
+    percentage = np.where(max_score > 0, (200 * score + max_score) // (2 * divisor), 0)
+    status = np.where(
+        (max_score > 0) & (100 * score >= above * max_score), 0,
+        np.where((max_score > 0) & (100 * score >= transition * max_score), 1, 2),
+    )
+
+    total_score = score.sum(axis=1)
+    total_max = max_score.sum(axis=1)
+    overall = np.where(total_max > 0, (200 * total_score + total_max) // (2 * np.maximum(total_max, 1)), 0)
+    return {
+        'responded': responded > 0,
+        'score': score,
+        'max_score': max_score,
+        'percentage': percentage,
+        'status': status,
+        'answers': answers,
+        'total_score': total_score,
+        'max_possible_score': total_max,
+        'overall_percentage': overall,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+
+def result_rows(ids, results, start, stop):
+    """assessment_results-shaped dicts for assessments ``start:stop``."""
+    columns = {name: results[name][start:stop].tolist() for name in results}
+    for i in range(stop - start):
+        present = [(c, j) for j, c in enumerate(CATEGORIES) if columns['responded'][i][j]]
+        yield {
+            'assessment_id': ids[start + i],
+            'total_score': columns['total_score'][i],
+            'max_possible_score': columns['max_possible_score'][i],
+            'overall_percentage': columns['overall_percentage'][i],
+            'category_scores': {c: columns['score'][i][j] for c, j in present},
+            'green_line_status': {c: STATUSES[columns['status'][i][j]] for c, j in present},
+            'category_percentages': {c: columns['percentage'][i][j] for c, j in present},
+            'answer_green_lines': {c: dict(zip(('above', 'neutral', 'below'), columns['answers'][i][j]))
+                                   for c, j in present},
+        }
+
+
+def sql_literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def write_results(path, ids, results, batch_size):
+    path = Path(path)
+    as_csv = path.suffix == '.csv'
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out) if as_csv else None
+        header = None
+        for start in range(0, len(ids), batch_size):
+            rows = list(result_rows(ids, results, start, min(start + batch_size, len(ids))))
+            if as_csv:
+                if header is None:
+                    header = list(rows[0])
+                    writer.writerow(header)
+                writer.writerows([json.dumps(row[c]) if isinstance(row[c], dict) else row[c] for c in header]
+                                 for row in rows)
+            else:
+                out.writelines(json.dumps(row) + '\n' for row in rows)
+            out.flush()
+
+
+def write_sql(path, ids, results, changed, batch_size, catalog):
+    """Batched UPDATEs for the changed responses and every re-scored assessment."""
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(f'-- Generated by scripts/database/rescore_assessments.py (catalog {catalog})\n'
+                  'BEGIN;\n'
+                  '-- Results are written below; skip the per-row update_scores_on_response_change trigger\n'
+                  'SET LOCAL session_replication_role = replica;\n\n')
+        for start in range(0, len(changed), batch_size):
+            values = ',\n  '.join(f'({sql_literal(rid)}::uuid, {value}, {sql_literal(green)})'
+                                  for rid, value, green in changed[start:start + batch_size])
+            out.write('UPDATE assessment_responses AS r\n'
+                      'SET response_value = v.value, green_line = v.green_line, updated_at = now()\n'
+                      f'FROM (VALUES\n  {values}\n) AS v(id, value, green_line)\n'
+                      'WHERE r.id = v.id;\n\n')
+            out.flush()
+
+        for start in range(0, len(ids), batch_size):
+            rows = result_rows(ids, results, start, min(start + batch_size, len(ids)))
+            values = ',\n  '.join(
+                f"({sql_literal(row['assessment_id'])}::uuid, {sql_literal(json.dumps(row['category_scores']))}::jsonb, "
+                f"{sql_literal(json.dumps(row['green_line_status']))}::jsonb, {row['total_score']}, "
+                f"{row['max_possible_score']}, {row['overall_percentage']})"
+                for row in rows
+            )
+            out.write('UPDATE assessment_results AS r\n'
+                      'SET category_scores = v.category_scores, green_line_status = v.green_line_status,\n'
+                      '    total_score = v.total_score,\n'
+                      '    max_possible_score = CASE WHEN v.max_possible_score > 0 THEN v.max_possible_score '
+                      'ELSE r.max_possible_score END,\n'
+                      '    overall_percentage = v.overall_percentage, updated_at = now()\n'
+                      f'FROM (VALUES\n  {values}\n) AS v(id, category_scores, green_line_status, total_score, '
+                      'max_possible_score, overall_percentage)\n'
+                      'WHERE r.id = v.id;\n\n')
+            out.flush()
+        out.write('COMMIT;\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-score exported assessment responses against the catalog')
+    parser.add_argument('responses', nargs='+', help='CSV (.csv/.csv.gz) or Parquet files/directories')
+    parser.add_argument('--matrix', help='scoring.json from build_questions.py (default: build from --catalog)')
+    parser.add_argument('--catalog', default=str(CATALOG_DIR), help='Directory of <category>.json files')
+    parser.add_argument('--out', help='Write per-assessment results (.jsonl or .csv)')
+    parser.add_argument('--sql', help='Write batched UPDATE statements')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per write / UPDATE statement')
+    args = parser.parse_args()
+
+    if np is None:
+        print('ERROR: numpy is required (pip install numpy)')
+        sys.exit(1)
+
+    try:
+        if args.matrix:
+            with open(args.matrix, encoding='utf-8') as f:
+                matrix = json.load(f)
+        else:
+            matrix = scoring_matrix(load_catalog(args.catalog))
+    except (CatalogError, OSError, json.JSONDecodeError) as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+
+    start = time.monotonic()
+    loader = ResponseLoader(matrix)
+    try:
+        for columns in read_chunks(args.responses):
+            loader.add(columns)
+    except (OSError, ValueError) as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+    responses = loader.responses()
+    ids = loader.assessment_ids
+    loaded = time.monotonic()
+
+    results = rescore(matrix, responses, len(ids))
+    scored = time.monotonic()
+
+    total = len(responses['value'])
+    resolved = int(responses['resolved'].sum())
+    not_applicable = int(responses['not_applicable'].sum())
+    print(f'Catalog {matrix["catalog"]}: {len(matrix["questions"])} questions')
+    print(f'Loaded {total:,} responses for {len(ids):,} assessments in {loaded - start:.2f}s')
+    print(f'  {resolved:,} matched an option, {total - resolved:,} kept their stored value, '
+          f'{not_applicable:,} N/A, {len(loader.changed):,} responses change score or green line')
+    print(f'Scored in {scored - loaded:.3f}s ({total / max(scored - loaded, 1e-9):,.0f} responses/s)')
+
+    if args.out:
+        write_results(args.out, ids, results, args.batch_size)
+        print(f'Wrote {len(ids):,} results to {args.out}')
+    if args.sql:
+        write_sql(args.sql, ids, results, loader.changed, args.batch_size, matrix['catalog'])
+        print(f'Wrote UPDATEs for {len(loader.changed):,} responses and {len(ids):,} assessments to {args.sql}')
+
+
+if __name__ == '__main__':
+    main()
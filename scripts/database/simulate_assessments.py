@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo simulation of the assessment catalog, plus a scoring benchmark
+
+Samples synthetic profiles and answer sets with NumPy's vectorized RNG and
+scores them with the engine from rescore_assessments.py:
+
+    - each profile field read by a condition (e.g. has_children) is drawn
+      uniformly from values that exercise every outcome of its conditions
+    - every visible question gets a uniformly random option, or N/A with
+      probability --na-rate
+
+The report covers each category's conditional branches (e.g. family with
+has_children true vs false):
+
+    - how many profiles landed in each branch, and the spread of their
+      category percentage and green-line status
+    - branches whose mean differs from a sibling's by more than --max-gap
+      points, or whose max score differs
+    - questions that no branch, or no sampled profile, can reach
+
+The benchmark scores synthetic catalogs of 1 to 12 categories and compares
+responses/s with a stored baseline. Categories that are not written yet are
+filled by cloning the existing ones.
+
+Usage:
+    python3 scripts/database/simulate_assessments.py [--profiles 1000000] [--seed 1]
+        [--matrix generated/scoring.json] [--report simulation.json]
+        [--baseline benchmarks/scoring_baseline.json] [--save-baseline] [--max-regression 0.2]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from build_questions import (
+    CATALOG_DIR, CATEGORIES, SCRIPT_DIR, CatalogError, evaluate_condition, field_probes, load_catalog, scoring_matrix,
+)
+from rescore_assessments import STATUSES, rescore
+
+PROFILES = 1_000_000
+BATCH_PROFILES = 100_000
+NA_RATE = 0.05
+MAX_GAP = 10  # percentage points between sibling branches
+# Tracked (generated/ is git-ignored) so the baseline survives clean checkouts
+BASELINE_PATH = SCRIPT_DIR / 'benchmarks' / 'scoring_baseline.json'
+BENCH_CATEGORY_COUNTS = (1, 2, 4, 8, 12)
+BENCH_PROFILES = 100_000
+BENCH_REPEATS = 3
+
+
+# ---------------------------------------------------------------------------
+# Sampling
+# ---------------------------------------------------------------------------
+
+def catalog_arrays(matrix):
+    """The scoring matrix as arrays, with a visibility lookup table per profile field."""
+    values = np.asarray(matrix['values'], dtype=np.int16)
+    whens = {}
+    for q, logic in enumerate(matrix['conditions']):
+        if logic:
+            whens.setdefault(logic['field'], []).append((q, logic['when']))
+
+    fields = {}
+    for field in sorted(whens):
+        probes = field_probes([when for _, when in whens[field]])
+        columns = [q for q, _ in whens[field]]
+        # visible[probe, i] for the i-th question conditioned on this field
+        table = np.array([[evaluate_condition(when, value) for _, when in whens[field]] for value in probes],
+                         dtype=bool)
+        fields[field] = {'values': probes, 'columns': np.asarray(columns), 'visible': table}
+
+    return {
+        'values': values,
+        'green_lines': np.asarray(matrix['greenLine'], dtype=np.int8),
+        'option_count': (values >= 0).sum(axis=1),
+        'category': np.asarray([CATEGORIES.index(matrix['categories'][c]) for c in matrix['category']],
+                               dtype=np.int8),
+        'fields': fields,
+    }
+
+
+def sample_batch(arrays, n, rng, na_rate):
+    """Draw ``n`` profiles and answer sets.
+
+    Returns (field value codes, visible (n x questions), responses) where
+    responses are the flat per-answer arrays rescore() takes.
+    """
+    questions = len(arrays['values'])
+    visible = np.ones((n, questions), dtype=bool)
+    codes = {}
+    for field, spec in arrays['fields'].items():
+        codes[field] = rng.integers(0, len(spec['values']), size=n)
+        visible[:, spec['columns']] = spec['visible'][codes[field]]
+
+    option = (rng.random((n, questions)) * arrays['option_count']).astype(np.int16)
+    not_applicable = rng.random((n, questions)) < na_rate
+
+    rows, columns = np.nonzero(visible)
+    chosen = option[rows, columns]
+    responses = {
+        'assessment': rows.astype(np.int32),
+        'category': arrays['category'][columns],
+        'value': arrays['values'][columns, chosen],
+        'green': arrays['green_lines'][columns, chosen],
+        'not_applicable': not_applicable[rows, columns],
+        'resolved': np.ones(len(rows), dtype=bool),
+    }
+    return codes, visible, responses
+
+
+def branch_ids(visible, branches):
+    """Index into ``branches`` of the question set each profile sees (-1 if none matches).
+
+    Only questions whose visibility differs between branches go into the
+    signature; unconditional questions are in every branch and add nothing.
+    """
+    sets = [set(branch['questions']) for branch in branches]
+    columns = sorted(set().union(*sets) - set.intersection(*sets)) if sets else []
+    if not columns:
+        return np.zeros(len(visible), dtype=np.int64)
+    if len(columns) > 62:
+        raise ValueError('branch signatures support up to 62 conditional questions per category')
+    position = {q: i for i, q in enumerate(columns)}
+    weights = np.left_shift(np.int64(1), np.arange(len(columns), dtype=np.int64))
+    signature = visible[:, columns].astype(np.int64) @ weights
+    known = {sum(1 << position[q] for q in branch['questions'] if q in position): i
+             for i, branch in enumerate(branches)}
+    uniques, inverse = np.unique(signature, return_inverse=True)
+    return np.asarray([known.get(int(s), -1) for s in uniques])[inverse]
+
+
+# ---------------------------------------------------------------------------
+# Simulation
+# ---------------------------------------------------------------------------
+
+def simulate(matrix, profiles, rng, na_rate=NA_RATE, batch=BATCH_PROFILES):
+    """Per-branch percentage histograms and question coverage over ``profiles`` samples."""
+    arrays = catalog_arrays(matrix)
+    categories = matrix['categories']
+    stats = {
+        category: [{'profiles': 0, 'all_na': 0, 'histogram': np.zeros(101, dtype=np.int64),
+                    'status': np.zeros(3, dtype=np.int64), 'score': 0}
+                   for _ in matrix['branches'][category]]
+        for category in categories
+    }
+    unmatched = dict.fromkeys(categories, 0)
+    seen = np.zeros(len(matrix['questions']), dtype=np.int64)
+
+    done = 0
+    while done < profiles:
+        n = min(batch, profiles - done)
+        _, visible, responses = sample_batch(arrays, n, rng, na_rate)
+        results = rescore(matrix, responses, n)
+        seen += visible.sum(axis=0)
+
+        for category in categories:
+            c = CATEGORIES.index(category)
+            ids = branch_ids(visible, matrix['branches'][category])
+            unmatched[category] += int((ids < 0).sum())
+            scored = results['max_score'][:, c] > 0
+            for b, entry in enumerate(stats[category]):
+                in_branch = ids == b
+                hit = in_branch & scored
+                entry['profiles'] += int(in_branch.sum())
+                entry['all_na'] += int((in_branch & ~scored & results['responded'][:, c]).sum())
+                entry['histogram'] += np.bincount(results['percentage'][hit, c], minlength=101)
+                entry['status'] += np.bincount(results['status'][hit, c], minlength=3)
+                entry['score'] += int(results['score'][hit, c].sum())
+        done += n
+
+    return stats, unmatched, seen
+
+
+def summarize(histogram):
+    total = int(histogram.sum())
+    if not total:
+        return {}
+    points = np.arange(len(histogram))
+    mean = float((points * histogram).sum() / total)
+    cumulative = np.cumsum(histogram)
+    percentile = lambda p: int(np.searchsorted(cumulative, p * total))
+    return {
+        'mean': round(mean, 2),
+        'std': round(float(np.sqrt(((points - mean) ** 2 * histogram).sum() / total)), 2),
+        'min': int(np.flatnonzero(histogram)[0]),
+        'p5': percentile(0.05),
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        'max': int(np.flatnonzero(histogram)[-1]),
+    }
+
+
+def build_report(matrix, stats, unmatched, seen, max_gap):
+    """Branch distributions, comparability flags and unreachable questions."""
+    report = {'categories': {}, 'flags': []}
+    for category, entries in stats.items():
+        branches = []
+        for branch, entry in zip(matrix['branches'][category], entries):
+            scored = int(entry['histogram'].sum())
+            branches.append({
+                'profile': branch['profile'],
+                'questions': len(branch['questions']),
+                'maxScore': branch['maxScore'],
+                'maxOptionScore': branch['maxOptionScore'],
+                'profiles': entry['profiles'],
+                'allNotApplicable': entry['all_na'],
+                'meanScore': round(entry['score'] / scored, 2) if scored else None,
+                'percentage': summarize(entry['histogram']),
+                'greenLine': {s: round(int(n) / scored, 4) if scored else 0.0
+                              for s, n in zip(STATUSES, entry['status'])},
+            })
+        report['categories'][category] = {'branches': branches, 'unmatchedProfiles': unmatched[category]}
+
+        label = lambda b: ', '.join(f'{k}={json.dumps(v)}' for k, v in b['profile'].items()) or 'all'
+        answered = [b for b in branches if b['questions'] and b['percentage']]
+        for i, first in enumerate(answered):
+            for second in answered[i + 1:]:
+                gap = abs(first['percentage']['mean'] - second['percentage']['mean'])
+                if gap > max_gap:
+                    report['flags'].append(f'{category}: mean {first["percentage"]["mean"]}% ({label(first)}) vs '
+                                           f'{second["percentage"]["mean"]}% ({label(second)}), {gap:.1f} points apart')
+                if first['maxScore'] != second['maxScore']:
+                    report['flags'].append(f'{category}: max score {first["maxScore"]} ({label(first)}) vs '
+                                           f'{second["maxScore"]} ({label(second)})')
+        for branch in branches:
+            if not branch['questions'] and branch['profiles']:
+                report['flags'].append(f'{category}: {label(branch)} shows no questions '
+                                       f'({branch["profiles"]:,} profiles)')
+        if unmatched[category]:
+            report['flags'].append(f'{category}: {unmatched[category]:,} profiles matched no enumerated branch')
+
+    in_branch = {q for category in matrix['branches'].values() for branch in category for q in branch['questions']}
+    report['unreachable'] = [qid for q, qid in enumerate(matrix['questions']) if q not in in_branch]
+    report['unsampled'] = [qid for q, qid in enumerate(matrix['questions']) if not seen[q]]
+    report['coverage'] = {qid: int(seen[q]) for q, qid in enumerate(matrix['questions'])}
+    for qid in report['unreachable']:
+        report['flags'].append(f'{qid}: no profile can reach this question')
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def scaled_matrix(matrix, count):
+    """The catalog spread over the first ``count`` categories, cloning existing ones to fill the rest."""
+    scaled = {key: matrix[key] for key in ('maxScorePerQuestion', 'thresholds', 'greenLines')}
+    scaled.update(categories=CATEGORIES[:count], questions=[], category=[], values=[], greenLine=[], conditions=[])
+    sources = matrix['categories']
+    for i, name in enumerate(scaled['categories']):
+        source = i % len(sources)
+        for q, c in enumerate(matrix['category']):
+            if c == source:
+                scaled['questions'].append(f'{name}:{matrix["questions"][q]}')
+                scaled['category'].append(i)
+                scaled['values'].append(matrix['values'][q])
+                scaled['greenLine'].append(matrix['greenLine'][q])
+                scaled['conditions'].append(matrix['conditions'][q])
+    return scaled
+
+
+def benchmark(matrix, rng, profiles=BENCH_PROFILES, na_rate=NA_RATE, counts=BENCH_CATEGORY_COUNTS):
+    """Best-of-N scoring throughput for catalogs of ``counts`` categories."""
+    rows = []
+    for count in counts:
+        scaled = scaled_matrix(matrix, count)
+        _, _, responses = sample_batch(catalog_arrays(scaled), profiles, rng, na_rate)
+        best = None
+        for _ in range(BENCH_REPEATS):
+            start = time.perf_counter()
+            rescore(scaled, responses, profiles)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        answers = len(responses['value'])
+        rows.append({
+            'categories': count,
+            'questions': len(scaled['questions']),
+            'responses': answers,
+            'seconds': round(best, 4),
+            'responsesPerSecond': round(answers / best),
+            'profilesPerSecond': round(profiles / best),
+        })
+    return rows
+
+
+def compare(rows, baseline, max_regression):
+    """Attach the baseline's throughput to each row; returns the rows that regressed."""
+    previous = {row['categories']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in rows:
+        base = previous.get(row['categories'])
+        if not base:
+            continue
+        row['baselineResponsesPerSecond'] = base['responsesPerSecond']
+        row['change'] = round(row['responsesPerSecond'] / base['responsesPerSecond'] - 1, 3)
+        if row['change'] < -max_regression:
+            regressions.append(row)
+    return regressions
+
+
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
+
+def print_report(report):
+    for category, entry in report['categories'].items():
+        print(f'\n{category}')
+        for branch in entry['branches']:
+            label = ', '.join(f'{k}={json.dumps(v)}' for k, v in branch['profile'].items()) or 'all'
+            pct = branch['percentage']
+            if not pct:
+                print(f'  {label:<24} {branch["profiles"]:>10,} profiles  no scored answers')
+                continue
+            shares = '  '.join(f'{s} {100 * share:.1f}%' for s, share in branch['greenLine'].items())
+            print(f'  {label:<24} {branch["profiles"]:>10,} profiles  {branch["questions"]:>2} questions  '
+                  f'max {branch["maxScore"]:>3}  mean {pct["mean"]:5.1f}% (sd {pct["std"]:4.1f})  '
+                  f'p5/p50/p95 {pct["p5"]}/{pct["p50"]}/{pct["p95"]}  {shares}')
+
+    print(f'\nUnreachable questions: {", ".join(report["unreachable"]) or "none"}')
+    if report['unsampled'] != report['unreachable']:
+        print(f'Never sampled: {", ".join(report["unsampled"]) or "none"}')
+    for flag in report['flags']:
+        print(f'WARNING: {flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate assessment branches and benchmark scoring')
+    parser.add_argument('--profiles', type=int, default=PROFILES, help='Profiles to sample')
+    parser.add_argument('--seed', type=int, default=1, help='RNG seed')
+    parser.add_argument('--na-rate', type=float, default=NA_RATE, help='Probability an answer is N/A')
+    parser.add_argument('--max-gap', type=float, default=MAX_GAP,
+                        help='Flag sibling branches whose mean percentage differs by more than this')
+    parser.add_argument('--matrix', help='scoring.json from build_questions.py (default: build from --catalog)')
+    parser.add_argument('--catalog', default=str(CATALOG_DIR), help='Directory of <category>.json files')
+    parser.add_argument('--report', help='Write the full report as JSON')
+    parser.add_argument('--no-benchmark', action='store_true', help='Skip the scoring benchmark')
+    parser.add_argument('--bench-profiles', type=int, default=BENCH_PROFILES, help='Profiles per benchmark run')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Stored benchmark baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Fail when throughput drops more than this fraction below the baseline')
+    args = parser.parse_args()
+
+    if np is None:
+        print('ERROR: numpy is required (pip install numpy)')
+        sys.exit(1)
+
+    try:
+        if args.matrix:
+            with open(args.matrix, encoding='utf-8') as f:
+                matrix = json.load(f)
+        else:
+            matrix = scoring_matrix(load_catalog(args.catalog))
+    except (CatalogError, OSError, json.JSONDecodeError) as e:
+        print(f'ERROR: {e}')
+        sys.exit(1)
+    if 'conditions' not in matrix:
+        print('ERROR: scoring matrix has no conditions; regenerate it with build_questions.py')
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.seed)
+    start = time.monotonic()
+    stats, unmatched, seen = simulate(matrix, args.profiles, rng, args.na_rate)
+    report = build_report(matrix, stats, unmatched, seen, args.max_gap)
+    report.update(catalog=matrix['catalog'], profiles=args.profiles, seed=args.seed, naRate=args.na_rate)
+    print(f'Simulated {args.profiles:,} profiles against catalog {matrix["catalog"]} '
+          f'in {time.monotonic() - start:.1f}s')
+    print_report(report)
+
+    regressions = []
+    if not args.no_benchmark:
+        rows = benchmark(matrix, rng, args.bench_profiles, args.na_rate)
+        try:
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            baseline = {}
+        regressions = compare(rows, baseline, args.max_regression)
+        report['benchmark'] = rows
+
+        print(f'\nScoring benchmark ({args.bench_profiles:,} profiles, best of {BENCH_REPEATS}):')
+        for row in rows:
+            change = f'  {100 * row["change"]:+.0f}% vs baseline' if 'change' in row else ''
+            print(f'  {row["categories"]:>2} categories  {row["questions"]:>4} questions  '
+                  f'{row["responses"]:>11,} responses  {row["seconds"]:.3f}s  '
+                  f'{row["responsesPerSecond"]:>13,} responses/s{change}')
+        if not baseline:
+            print(f'  No baseline at {args.baseline}; store one with --save-baseline')
+        else:
+            if baseline.get('profiles') != args.bench_profiles:
+                measured = f'{baseline["profiles"]:,}' if baseline.get('profiles') else 'an unknown number of'
+                print(f'  Note: the baseline was measured with {measured} profiles per run')
+            if baseline.get('host') != platform.node():
+                print(f'  Note: the baseline was measured on {baseline.get("host") or "another host"} '
+                      f'({baseline.get("machine") or "unknown machine"}), not {platform.node()}')
+        if args.save_baseline:
+            Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+            with open(args.baseline, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'catalog': matrix['catalog'],
+                    'host': platform.node(),
+                    'machine': f'{platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}, '
+                               f'numpy {np.__version__ if np else "not installed"}',
+                    'profiles': args.bench_profiles,
+                    'results': rows,
+                }, f, indent=2)
+                f.write('\n')
+            print(f'  Saved baseline to {args.baseline}')
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f'Wrote report to {args.report}')
+
+    for row in regressions:
+        print(f'ERROR: scoring {row["categories"]} categories is {-100 * row["change"]:.0f}% slower than the baseline')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,8 @@ Steps:
     2. transcribe      - Transcribe with speaker diarization (fal.ai Whisper)
     3. analyze         - AI picks best testimonial segments (OpenAI GPT-4)
     4. cut             - Auto-cut video into clips (FFmpeg)
-    all                - Run all steps sequentially
+    5. reel            - Concatenate top clips into a highlight reel (FFmpeg, no re-encode)
+    all                - Run steps 1-4 sequentially
 
 Examples:
     # Run everything:
@@ -24,6 +25,9 @@ Examples:
 
     # Re-run AI analysis with different criteria:
     python3 scripts/video/testimonial_extractor.py /path/to/video.mp4 --step analyze
+
+    # Build a highlight reel from the rank-1 and rank-2 clips:
+    python3 scripts/video/testimonial_extractor.py /path/to/video.mp4 --step reel --ranks 1,2
 """
 
 import argparse
@@ -127,6 +131,11 @@ def format_timestamp_short(seconds: float) -> str:
     return f"{m:02d}:{s:02d}"
 
 
+def format_timestamp_srt(seconds: float) -> str:
+    """Convert seconds to HH:MM:SS,mmm format for SRT subtitles."""
+    return format_timestamp(seconds).replace(".", ",")
+
+
 # ---------------------------------------------------------------------------
 # Step 1: Extract Audio
 # ---------------------------------------------------------------------------
@@ -427,6 +436,18 @@ def build_analysis_text(transcript_data: dict) -> str:
 # Step 4: Cut Video
 # ---------------------------------------------------------------------------
 
+def clip_output_path(output_dir: Path, index: int, clip: dict) -> Path:
+    """Filename for the index-th (1-based) recommended clip."""
+    rank = clip.get("rank", 0)
+    title = clip.get("suggested_title", f"clip_{index}")
+
+    # Sanitize title for filename
+    safe_title = "".join(c if c.isalnum() or c in " -_" else "" for c in title)
+    safe_title = safe_title.strip().replace(" ", "_")[:50]
+
+    return output_dir / f"rank{rank}_{index:02d}_{safe_title}.mp4"
+
+
 def cut_video(video_path: str, work_dir: Path) -> None:
     """Cut the original video into clips based on AI recommendations."""
     clips_path = work_dir / "recommended_clips.json"
@@ -443,16 +464,9 @@ def cut_video(video_path: str, work_dir: Path) -> None:
     print(f"  Cutting {len(clips)} clips from video...\n")
 
     for i, clip in enumerate(clips, 1):
-        rank = clip.get("rank", 0)
         start = clip.get("start_time", 0)
         end = clip.get("end_time", 0)
-        title = clip.get("suggested_title", f"clip_{i}")
-
-        # Sanitize title for filename
-        safe_title = "".join(c if c.isalnum() or c in " -_" else "" for c in title)
-        safe_title = safe_title.strip().replace(" ", "_")[:50]
-
-        output_file = output_dir / f"rank{rank}_{i:02d}_{safe_title}.mp4"
+        output_file = clip_output_path(output_dir, i, clip)
 
         if output_file.exists():
             print(f"  [{i}/{len(clips)}] Already exists: {output_file.name}")
@@ -499,6 +513,285 @@ def cut_video(video_path: str, work_dir: Path) -> None:
     print(f"  Total clips: {len(clips)}")
 
 
+# ---------------------------------------------------------------------------
+# Step 5: Highlight Reel
+# ---------------------------------------------------------------------------
+
+# Codec profile that incompatible clips are normalized to before concatenation.
+# Resolution, frame rate, timebase and sample rate are taken from the most
+# common clip so the majority of clips can be stream-copied untouched.
+REEL_VIDEO_CODEC = "h264"
+REEL_AUDIO_CODEC = "aac"
+REEL_FALLBACK_FRAME_RATE = "30/1"
+
+# ffprobe profile name -> libx264 -profile:v
+X264_PROFILES = {
+    "Constrained Baseline": "baseline",
+    "Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+
+def probe_clip(path: Path) -> dict:
+    """Read the stream parameters that must match for concat stream copy."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries",
+            "stream=codec_type,codec_name,profile,level,width,height,pix_fmt,"
+            "r_frame_rate,time_base,sample_rate,channels:format=duration",
+            "-of", "json",
+            str(path),
+        ],
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        print(f"  ERROR: ffprobe failed on {path.name}:\n{result.stderr[-500:]}")
+        sys.exit(1)
+
+    data = json.loads(result.stdout)
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), {})
+    audio = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), {})
+
+    return {
+        "duration": float(data.get("format", {}).get("duration") or 0),
+        "signature": (
+            video.get("codec_name"),
+            video.get("profile"),
+            video.get("width"),
+            video.get("height"),
+            video.get("pix_fmt"),
+            video.get("r_frame_rate"),
+            video.get("time_base"),
+            audio.get("codec_name"),
+            audio.get("sample_rate"),
+            audio.get("channels"),
+            audio.get("time_base"),
+            video.get("level"),
+        ),
+    }
+
+
+def pick_reel_profile(probes: list) -> tuple:
+    """Pick the target signature: the most common one using the reel codecs."""
+    counts = {}
+    for probe in probes:
+        sig = probe["signature"]
+        if sig[0] == REEL_VIDEO_CODEC and sig[7] == REEL_AUDIO_CODEC:
+            counts[sig] = counts.get(sig, 0) + 1
+
+    if counts:
+        return max(counts, key=counts.get)
+
+    # Nothing is copyable as-is; normalize everything to the first clip's geometry.
+    # The unknown fields (None) are filled in from the first normalized clip.
+    first = probes[0]["signature"]
+    return (REEL_VIDEO_CODEC, "High", first[2], first[3], "yuv420p", first[5] or REEL_FALLBACK_FRAME_RATE,
+            None, REEL_AUDIO_CODEC, first[8] or "48000", first[9] or 2, None, None)
+
+
+def normalize_clip(clip_file: Path, profile: tuple, normalized_dir: Path) -> Path:
+    """Re-encode a clip to the reel profile (once; the result is cached).
+
+    Exits if the re-encoded clip does not probe back to ``profile``, since
+    the concat stream copy would then produce a broken reel.
+    """
+    _, h264_profile, width, height, pix_fmt, frame_rate, time_base, _, sample_rate, channels, _, level = profile
+
+    profile_tag = f"{width}x{height}_{frame_rate.replace('/', '-')}_{sample_rate}"
+    if h264_profile:
+        profile_tag += f"_{X264_PROFILES.get(h264_profile, h264_profile)}"
+    if level:
+        profile_tag += f"_L{level}"
+    output_file = normalized_dir / f"{clip_file.stem}__{profile_tag}.mp4"
+    if output_file.exists() and signature_matches(probe_clip(output_file)["signature"], profile):
+        print(f"    Using cached normalized clip: {output_file.name}")
+        return output_file
+
+    cmd = [
+        "ffmpeg", "-i", str(clip_file),
+        "-vf", f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+               f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1",
+        "-r", frame_rate,
+        "-pix_fmt", pix_fmt or "yuv420p",
+        "-c:v", "libx264", "-preset", "fast", "-crf", "18",
+    ]
+    if h264_profile:
+        if h264_profile not in X264_PROFILES:
+            print(f"  ERROR: Cannot encode H.264 profile {h264_profile!r} for {clip_file.name}")
+            sys.exit(1)
+        cmd += ["-profile:v", X264_PROFILES[h264_profile]]
+    if level:
+        # ffprobe reports the level as an integer (40 = level 4.0)
+        cmd += ["-level", f"{int(level) / 10:.1f}"]
+    cmd += [
+        "-c:a", "aac", "-b:a", "192k",
+        "-ar", str(sample_rate), "-ac", str(channels),
+    ]
+    # Match the container timebase so concatenated timestamps line up
+    if time_base and time_base.startswith("1/"):
+        cmd += ["-video_track_timescale", time_base.split("/", 1)[1]]
+    cmd += ["-y", str(output_file)]
+
+    print(f"    Re-encoding to reel profile: {clip_file.name}")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"  ERROR: FFmpeg failed normalizing {clip_file.name}:\n{result.stderr[-500:]}")
+        sys.exit(1)
+
+    actual = probe_clip(output_file)["signature"]
+    if not signature_matches(actual, profile):
+        print(f"  ERROR: Normalized {clip_file.name} does not match the reel profile:\n"
+              f"    expected {profile}\n    got      {actual}")
+        sys.exit(1)
+
+    return output_file
+
+
+def signature_matches(signature: tuple, profile: tuple) -> bool:
+    """True if ``signature`` matches ``profile``; None fields in the profile match anything."""
+    return all(want is None or have == want for have, want in zip(signature, profile))
+
+
+def build_lower_thirds(transcript_data: dict, segments: list) -> str:
+    """Build SRT lower-thirds from transcript chunks, shifted onto the reel timeline.
+
+    Each segment is a (start_time, end_time, reel_offset, reel_duration) tuple.
+    """
+    chunks = transcript_data.get("chunks", [])
+    cues = []
+
+    for seg_start, seg_end, offset, seg_duration in segments:
+        for chunk in chunks:
+            ts = chunk.get("timestamp", [0, 0])
+            start = ts[0] if ts[0] else 0
+            end = ts[1] if ts[1] else start
+            text = chunk.get("text", "").strip()
+            if not text or end <= seg_start or start >= seg_end:
+                continue
+
+            cue_start = max(start, seg_start) - seg_start
+            cue_end = min(end, seg_end) - seg_start
+            cue_end = min(cue_end, seg_duration)
+            if cue_end <= cue_start:
+                continue
+
+            speaker = chunk.get("speaker") or "Unknown"
+            cues.append((offset + cue_start, offset + cue_end, f"{speaker}\n{text}"))
+
+    lines = []
+    for n, (start, end, text) in enumerate(cues, 1):
+        lines.append(str(n))
+        lines.append(f"{format_timestamp_srt(start)} --> {format_timestamp_srt(end)}")
+        lines.append(text)
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def build_reel(work_dir: Path, ranks: list = None) -> None:
+    """Concatenate cut clips into a highlight reel using stream copy."""
+    clips_path = work_dir / "recommended_clips.json"
+    if not clips_path.exists():
+        print("  ERROR: No clip recommendations found. Run the analyze step first.")
+        sys.exit(1)
+
+    with open(clips_path) as f:
+        clips = json.load(f)
+
+    clips_dir = work_dir / "clips"
+    selected = []
+    for i, clip in enumerate(clips, 1):
+        if ranks and clip.get("rank") not in ranks:
+            continue
+        clip_file = clip_output_path(clips_dir, i, clip)
+        if not clip_file.exists():
+            print(f"  ERROR: Missing clip {clip_file.name}. Run the cut step first.")
+            sys.exit(1)
+        selected.append((clip, clip_file))
+
+    if not selected:
+        print(f"  ERROR: No clips match ranks {ranks}.")
+        sys.exit(1)
+
+    reel_dir = work_dir / "reel"
+    normalized_dir = reel_dir / "normalized"
+    normalized_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"  Probing {len(selected)} clips...")
+    probes = [probe_clip(clip_file) for _, clip_file in selected]
+    profile = pick_reel_profile(probes)
+    fallback = profile not in {probe["signature"] for probe in probes}
+
+    # Stream-copy compatible clips; re-encode only the odd ones out
+    parts = []
+    reencoded = 0
+    for (clip, clip_file), probe in zip(selected, probes):
+        if probe["signature"] == profile:
+            parts.append((clip, clip_file, probe["duration"]))
+            continue
+        normalized = normalize_clip(clip_file, profile, normalized_dir)
+        normalized_probe = probe_clip(normalized)
+        if fallback:
+            # The first re-encode pins the fields the fallback profile left to ffmpeg
+            profile = normalized_probe["signature"]
+            fallback = False
+        parts.append((clip, normalized, normalized_probe["duration"]))
+        reencoded += 1
+
+    print(f"  {len(parts) - reencoded} clips stream-copied, {reencoded} re-encoded")
+
+    # Lower-thirds from the transcript chunk timestamps
+    segments = []
+    offset = 0.0
+    for clip, _, duration in parts:
+        segments.append((clip.get("start_time", 0), clip.get("end_time", 0), offset, duration))
+        offset += duration
+
+    rank_tag = "all" if not ranks else "-".join(str(r) for r in ranks)
+    subtitles_path = reel_dir / f"reel_rank{rank_tag}_lower_thirds.srt"
+    transcript_path = work_dir / "transcript.json"
+    if transcript_path.exists():
+        with open(transcript_path) as f:
+            transcript_data = json.load(f)
+        with open(subtitles_path, "w") as f:
+            f.write(build_lower_thirds(transcript_data, segments))
+        print(f"  Saved lower-thirds: {subtitles_path}")
+    else:
+        print("  No transcript found, skipping lower-thirds.")
+        subtitles_path = None
+
+    list_path = reel_dir / f"reel_rank{rank_tag}_concat.txt"
+    with open(list_path, "w") as f:
+        for _, part_file, _ in parts:
+            escaped = str(part_file.resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    output_file = reel_dir / f"reel_rank{rank_tag}.mp4"
+    cmd = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", str(list_path)]
+    if subtitles_path:
+        cmd += ["-i", str(subtitles_path), "-map", "0:v", "-map", "0:a?", "-map", "1:s",
+                "-c", "copy", "-c:s", "mov_text"]
+    else:
+        cmd += ["-c", "copy"]
+    cmd += ["-movflags", "+faststart", "-y", str(output_file)]
+
+    print(f"  Concatenating {len(parts)} clips ({format_timestamp_short(offset)})...")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"  ERROR: FFmpeg concat failed:\n{result.stderr[-500:]}")
+        sys.exit(1)
+
+    size_mb = os.path.getsize(output_file) / (1024 * 1024)
+    print(f"\n  Reel saved: {output_file} ({size_mb:.1f} MB)")
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
@@ -510,12 +803,18 @@ def main():
     parser.add_argument("video", help="Path to the input video file")
     parser.add_argument(
         "--step",
-        choices=["extract_audio", "transcribe", "analyze", "cut", "all"],
+        choices=["extract_audio", "transcribe", "analyze", "cut", "reel", "all"],
         default="all",
         help="Which step to run (default: all)",
     )
+    parser.add_argument(
+        "--ranks",
+        help="Comma-separated clip ranks to include in the reel, e.g. 1,2 (default: all)",
+    )
     args = parser.parse_args()
 
+    ranks = [int(r) for r in args.ranks.split(",")] if args.ranks else None
+
     video_path = os.path.abspath(args.video)
     if not os.path.exists(video_path):
         print(f"ERROR: Video file not found: {video_path}")
@@ -539,6 +838,7 @@ def main():
         ),
         "analyze": lambda: analyze(work_dir),
         "cut": lambda: cut_video(video_path, work_dir),
+        "reel": lambda: build_reel(work_dir, ranks),
     }
 
     if args.step == "all":